@@ -23,6 +23,9 @@ setup(
         "pillow",
         "graphviz",
     ],
+    extras_require={
+        "pdf": ["pypdf"],  # merge diagram sheets and BOM page into one PDF
+    },
     license="GPLv3",
     keywords="cable connector hardware harness wiring wiring-diagram wiring-harness",
     url=APP_URL,
@@ -32,6 +35,8 @@ setup(
     entry_points={
         "console_scripts": [
             "wireviz=wireviz.wv_cli:wireviz",
+            "wireviz-bom=wireviz.wv_cli:wireviz_bom",
+            "wireviz-doc=wireviz.wv_cli:wireviz_doc",
         ],
     },
     classifiers=[
@@ -23,6 +23,7 @@ CableMultiplier = (
     PlainText  # = Literal['wirecount', 'terminations', 'length', 'total_length']
 )
 ImageScale = PlainText  # = Literal['false', 'true', 'width', 'height', 'both']
+RenderProfile = PlainText  # = Literal['full', 'draft']
 
 # Type combinations
 Pin = Union[int, PlainText]  # Pin identifier
@@ -58,8 +59,16 @@ class Options:
     color_mode: ColorMode = "SHORT"
     mini_bom_mode: bool = True
     template_separator: str = "."
+    partition: bool = False
+    sheet_max_nodes: Optional[int] = None
+    render_backend: Optional[str] = None
+    render_profile: RenderProfile = "full"
+    reuse_layout: bool = False
+    image_dpi: Optional[int] = None
 
     def __post_init__(self):
+        if self.render_profile not in ("full", "draft"):
+            raise Exception(f"Unknown render profile: {self.render_profile}")
         if not self.bgcolor_node:
             self.bgcolor_node = self.bgcolor
         if not self.bgcolor_connector:
@@ -410,8 +419,14 @@ class Cable:
             )
 
 
+# The classes below are instantiated once per termination or mate, so they use
+# __slots__ instead of a per-instance __dict__ to reduce memory use in large harnesses.
+# (Declared manually, since dataclass(slots=True) requires Python 3.10)
+
+
 @dataclass
 class Connection:
+    __slots__ = ("from_name", "from_pin", "via_port", "to_name", "to_pin")
     from_name: Optional[Designator]
     from_pin: Optional[Pin]
     via_port: Wire
@@ -421,6 +436,7 @@ class Connection:
 
 @dataclass
 class MatePin:
+    __slots__ = ("from_name", "from_pin", "to_name", "to_pin", "shape")
     from_name: Designator
     from_pin: Pin
     to_name: Designator
@@ -430,6 +446,7 @@ class MatePin:
 
 @dataclass
 class MateComponent:
+    __slots__ = ("from_name", "to_name", "shape")
     from_name: Designator
     to_name: Designator
     shape: str
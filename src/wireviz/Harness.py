@@ -1,25 +1,37 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
+import json
 import re
 from collections import Counter
-from dataclasses import dataclass
+from dataclasses import astuple, dataclass
+from html import escape
+from io import StringIO, TextIOWrapper
 from itertools import zip_longest
 from pathlib import Path
-from typing import Any, List, Union
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
+import graphviz
 from graphviz import Graph
 from wireviz import APP_NAME, APP_URL, __version__, wv_colors
 from wireviz.DataClasses import (
     Cable,
     Connector,
+    Designator,
     MateComponent,
     MatePin,
     Metadata,
     Options,
+    Pin,
     Side,
     Tweak,
+    Wire,
+)
+from wireviz.svgembed import (
+    embed_svg_images,
+    embed_svg_images_file,
+    embed_svg_images_stream,
 )
-from wireviz.svgembed import embed_svg_images, embed_svg_images_file
 from wireviz.wv_bom import (
     HEADER_MPN,
     HEADER_PN,
@@ -42,7 +54,11 @@ from wireviz.wv_gv_html import (
     remove_links,
 )
 from wireviz.wv_helper import (
+    DisjointSet,
     awg_equiv,
+    file_read_text,
+    file_replace,
+    file_write_bytes,
     file_write_text,
     flatten2d,
     is_arrow,
@@ -50,6 +66,14 @@ from wireviz.wv_helper import (
     tuplelist2tsv,
 )
 from wireviz.wv_html import generate_html_output
+from wireviz.wv_render import (
+    compose_pdf,
+    compose_png,
+    compose_svg,
+    get_render_backend,
+    parse_plain_positions,
+    render_parallel,
+)
 
 OLD_CONNECTOR_ATTR = {
     "pinout": "was renamed to 'pinlabels' in v0.2",
@@ -75,26 +99,87 @@ class Harness:
         self.connectors = {}
         self.cables = {}
         self.mates = []
-        self._bom = []  # Internal Cache for generated bom
+        self.sheets = []  # explicit grouping of designators per sheet
+        self._bom = None  # Internal Cache for generated bom
+        self._bom_version = 0  # Incremented whenever the BOM might change
+        self._graph = None  # Internal Cache for generated graph
+        # Internal Cache for generated Graphviz statements of each component,
+        # valid for the options in _node_cache_options only
+        self._node_cache = {}
+        self._node_cache_options = None
+        # Node positions and label hashes from a previous render, see load_layout()
+        self._layout = {}
+        self._nets = None  # Internal Cache for the connectivity index, see nets()
         self.additional_bom_items = []
 
+    def __getstate__(self) -> dict:
+        """Return the state for pickling, without the caches of rendering data."""
+        state = self.__dict__.copy()
+        state["_graph"] = None
+        state["_node_cache"] = {}
+        state["_node_cache_options"] = None
+        state["_layout"] = {}
+        state["_nets"] = None
+        return state
+
+    def _invalidate(self, *names: Designator) -> None:
+        """Discard the cached graph and BOM, and the cached statements of the named components."""
+        self._graph = None
+        self._bom = None
+        self._bom_version += 1
+        self._nets = None
+        for name in names:
+            self._node_cache.pop(name, None)
+
+    def invalidate(self, *names: Designator) -> None:
+        """Discard cached output affected by changes to the named components.
+
+        Without any names, all cached output is discarded. Call this after
+        modifying attributes of the harness or its components directly;
+        the add_*() and connect() methods do this automatically."""
+        if not names:
+            self._node_cache.clear()
+        # cables show the names and pin labels of the connectors they connect to
+        connected_cables = [
+            cable.name
+            for cable in self.cables.values()
+            if any(
+                connection.from_name in names or connection.to_name in names
+                for connection in cable.connections
+            )
+        ]
+        self._invalidate(*names, *connected_cables)
+
     def add_connector(self, name: str, *args, **kwargs) -> None:
         check_old(f"Connector '{name}'", OLD_CONNECTOR_ATTR, kwargs)
+        replaced = name in self.connectors
         self.connectors[name] = Connector(name, *args, **kwargs)
+        if replaced:
+            self.invalidate(name)
+        else:
+            self._invalidate(name)
 
     def add_cable(self, name: str, *args, **kwargs) -> None:
         self.cables[name] = Cable(name, *args, **kwargs)
+        self._invalidate(name)
 
     def add_mate_pin(self, from_name, from_pin, to_name, to_pin, arrow_type) -> None:
         self.mates.append(MatePin(from_name, from_pin, to_name, to_pin, arrow_type))
         self.connectors[from_name].activate_pin(from_pin, Side.RIGHT)
         self.connectors[to_name].activate_pin(to_pin, Side.LEFT)
+        self._invalidate(from_name, to_name)
 
     def add_mate_component(self, from_name, to_name, arrow_type) -> None:
         self.mates.append(MateComponent(from_name, to_name, arrow_type))
+        self._graph = None  # mates are not part of any cached component statements
 
     def add_bom_item(self, item: dict) -> None:
         self.additional_bom_items.append(item)
+        self._invalidate()
+
+    def add_sheet(self, designators: List[Designator]) -> None:
+        self.sheets.append(designators)
+        self._graph = None  # sheet_groups() depends on the sheets
 
     def connect(
         self,
@@ -160,8 +245,248 @@ class Harness:
             self.connectors[from_name].activate_pin(from_pin, Side.RIGHT)
         if to_name in self.connectors:
             self.connectors[to_name].activate_pin(to_pin, Side.LEFT)
+        self._invalidate(from_name, via_name, to_name)
+
+    def add_connections(
+        self,
+        from_name: Optional[Designator],
+        from_pins: Optional[Sequence[Pin]],
+        via_name: Designator,
+        via_wires: Sequence[Wire],
+        to_name: Optional[Designator],
+        to_pins: Optional[Sequence[Pin]],
+    ) -> None:
+        """Connect many wires of one cable between two connectors at once.
+
+        This is equivalent to calling connect() once for each set of
+        corresponding elements of from_pins, via_wires and to_pins, but the
+        pin and wire lookup tables are built only once per call. This is
+        the recommended way to populate large machine-generated harnesses.
+        As in connect(), pins may be given as pin numbers or pin labels,
+        and wires as wire numbers, colors or wire labels.
+        from_pins and to_pins must be None when from_name and to_name are None.
+        """
+        count = len(via_wires)
+        for name, pins in ((from_name, from_pins), (to_name, to_pins)):
+            if name is None:
+                if pins is not None:
+                    raise Exception(f"Pins specified without a connector: {pins}")
+            elif len(pins) != count:
+                raise Exception(
+                    f"{name}: {len(pins)} pins specified for {count} wires of {via_name}"
+                )
+
+        def resolve_pins(name: Optional[Designator], pins) -> list:
+            if name is None:
+                return [None] * count
+            if name not in self.connectors:
+                return list(pins)
+            lookup, errors = self._pin_lookup(self.connectors[name])
+            resolved = []
+            for pin in pins:
+                if pin in errors:
+                    raise Exception(f"{name}:{pin} {errors[pin]}")
+                if pin not in lookup:
+                    raise Exception(f"{name}:{pin} not found.")
+                resolved.append(lookup[pin])
+            return resolved
+
+        from_pins = resolve_pins(from_name, from_pins)
+        to_pins = resolve_pins(to_name, to_pins)
+
+        cable = self.cables[via_name]
+        lookup, errors = self._wire_lookup(cable)
+        wires = []
+        for wire in via_wires:
+            if wire in errors:
+                raise Exception(f"{via_name}:{wire} {errors[wire]}")
+            wires.append(lookup.get(wire, wire))
+
+        # perform the actual connections
+        cable.connect(
+            from_name, tuple(from_pins), tuple(wires), to_name, tuple(to_pins)
+        )
+        for name, pins, side in (
+            (from_name, from_pins, Side.RIGHT),
+            (to_name, to_pins, Side.LEFT),
+        ):
+            if name in self.connectors:
+                connector = self.connectors[name]
+                for pin in pins:
+                    connector.activate_pin(pin, side)
+        self._invalidate(from_name, via_name, to_name)
+
+    @staticmethod
+    def _pin_lookup(connector: Connector) -> Tuple[dict, dict]:
+        """Return dicts mapping pin numbers and labels to pin numbers, and ambiguous ones to errors."""
+        lookup = {pin: pin for pin in connector.pins}
+        pins = set(connector.pins)
+        errors = {}
+        label_indices = {}
+        for index, label in enumerate(connector.pinlabels):
+            label_indices.setdefault(label, []).append(index)
+        for label, indices in label_indices.items():
+            if label in pins and connector.pins.index(label) != indices[0]:
+                errors[label] = (
+                    "is defined both in pinlabels and pins, for different pins."
+                )
+            elif len(indices) > 1:
+                errors[label] = "is defined more than once."
+            elif indices[0] < len(connector.pins):
+                lookup[label] = connector.pins[indices[0]]
+        return lookup, errors
+
+    @staticmethod
+    def _wire_lookup(cable: Cable) -> Tuple[dict, dict]:
+        """Return dicts mapping wire colors and labels to wire numbers, and ambiguous ones to errors."""
+        lookup = {}
+        errors = {}
+        # wire labels first, so that colors take precedence like in connect()
+        for names in (cable.wirelabels, cable.colors):
+            indices = {}
+            for index, name in enumerate(names):
+                indices.setdefault(name, []).append(index)
+            for name, wire_indices in indices.items():
+                if len(wire_indices) > 1:
+                    errors[name] = "is used for more than one wire."
+                else:
+                    errors.pop(name, None)
+                    # list index starts at 0, wire IDs start at 1
+                    lookup[name] = wire_indices[0] + 1
+        for name in set(cable.colors) & set(cable.wirelabels):
+            if cable.colors.index(name) != cable.wirelabels.index(name):
+                errors[name] = (
+                    "is defined both in colors and wirelabels, for different wires."
+                )
+        return lookup, errors
+
+    def connected_components(self) -> List[List[Designator]]:
+        """Return lists of connector and cable designators that are linked by connections or mates."""
+        components = DisjointSet()
+        for name in list(self.connectors) + list(self.cables):
+            components.add(name)
+        for cable in self.cables.values():
+            for connection in cable.connections:
+                for name in (connection.from_name, connection.to_name):
+                    if name is not None:
+                        components.union(cable.name, name)
+        for mate in self.mates:
+            components.union(mate.from_name, mate.to_name)
+        return components.groups()
+
+    def _net_index(self) -> Tuple[DisjointSet, Dict[tuple, tuple]]:
+        """Return the union-find structure over all connector pins and wires, and the net of each."""
+        if self._nets is None:
+            nets = DisjointSet()
+            # Connector pins first, so that nets are ordered by connector and pin
+            for connector in self.connectors.values():
+                for pin in connector.pins:
+                    nets.add((connector.name, pin))
+            for cable in self.cables.values():
+                for connection in cable.connections:
+                    wire = (cable.name, connection.via_port)
+                    nets.add(wire)
+                    if connection.from_name is not None:
+                        nets.union((connection.from_name, connection.from_pin), wire)
+                    if connection.to_name is not None:
+                        nets.union(wire, (connection.to_name, connection.to_pin))
+            for connector in self.connectors.values():
+                for pin_a, pin_b in connector.loops:
+                    nets.union((connector.name, pin_a), (connector.name, pin_b))
+            for mate in self.mates:
+                # Mated components (without pins) do not define which pins mate
+                if isinstance(mate, MatePin):
+                    nets.union(
+                        (mate.from_name, mate.from_pin), (mate.to_name, mate.to_pin)
+                    )
+            groups = [group for group in nets.groups() if len(group) > 1]
+            self._nets = (nets, {nets.find(group[0]): group for group in groups})
+        return self._nets
+
+    def nets(self) -> List[List[Tuple[Designator, Pin]]]:
+        """Return the (connector, pin) pairs of each set of electrically connected pins.
+
+        Wires, connector loops and mated pins connect pins. Pins that are
+        not connected to anything are left out."""
+        nets = []
+        for group in self._net_index()[1].values():
+            pins = [node for node in group if node[0] in self.connectors]
+            if pins:
+                nets.append(pins)
+        return nets
+
+    def net_of(self, connector: Designator, pin: Pin) -> List[Tuple[Designator, Pin]]:
+        """Return the (connector, pin) pairs connected to the given pin, including itself.
+
+        The pin may be given as pin number or pin label."""
+        if connector not in self.connectors:
+            raise Exception(f"{connector} not found.")
+        lookup, errors = self._pin_lookup(self.connectors[connector])
+        if pin in errors:
+            raise Exception(f"{connector}:{pin} {errors[pin]}")
+        if pin not in lookup:
+            raise Exception(f"{connector}:{pin} not found.")
+        pin = lookup[pin]  # map pin name to pin number
+        index, groups = self._net_index()
+        group = groups.get(index.find((connector, pin)), [(connector, pin)])
+        return [node for node in group if node[0] in self.connectors]
+
+    def netlist(self) -> List[Dict[str, Any]]:
+        """Return the name, connector pins and wires of each net, e.g. for export."""
+        netlist = []
+        for group in self._net_index()[1].values():
+            pins = [node for node in group if node[0] in self.connectors]
+            if not pins:
+                continue
+            netlist.append(
+                {
+                    "net": f"N{len(netlist) + 1}",
+                    "pins": [
+                        {
+                            "connector": name,
+                            "pin": pin,
+                            "pinlabel": self._pin_label(name, pin),
+                        }
+                        for name, pin in pins
+                    ],
+                    "wires": [
+                        {"cable": name, "wire": wire}
+                        for name, wire in group
+                        if name in self.cables
+                    ],
+                }
+            )
+        return netlist
+
+    def _pin_label(self, connector: Designator, pin: Pin) -> Optional[Pin]:
+        """Return the label of the connector pin, if any."""
+        connector = self.connectors[connector]
+        index = connector.pins.index(pin)
+        if index < len(connector.pinlabels) and connector.pinlabels[index] != "":
+            return connector.pinlabels[index]
+        return None
+
+    def netlist_text(self, fmt: str) -> str:
+        """Return the netlist as compact JSON (fmt "netjson") or as TSV with one row per pin (fmt "net")."""
+        netlist = self.netlist()
+        if fmt == "netjson":
+            return json.dumps(netlist, separators=(",", ":")) + "\n"
+        rows = [("Net", "Designator", "Pin", "Pinlabel")]
+        for net in netlist:
+            for pin in net["pins"]:
+                rows.append(
+                    (net["net"], pin["connector"], pin["pin"], pin["pinlabel"] or "")
+                )
+        return tuplelist2tsv(rows)
+
+    def create_graph(self, designators: Optional[Iterable[Designator]] = None) -> Graph:
+        """Return the diagram graph, optionally limited to the listed components."""
+        if designators is not None:
+            designators = set(designators)
+
+        def included(name: Designator) -> bool:
+            return designators is None or name in designators
 
-    def create_graph(self) -> Graph:
         dot = Graph()
         dot.body.append(f"// Graph generated by {APP_NAME} {__version__}\n")
         dot.body.append(f"// {APP_URL}\n")
@@ -184,11 +509,51 @@ class Harness:
             fontname=self.options.fontname,
         )
         dot.attr("edge", style="bold", fontname=self.options.fontname)
+        draft = self.options.render_profile == "draft"
+        if draft:
+            # Trade layout quality for speed, and mark the output as a draft
+            dot.attr(
+                "graph",
+                splines="line",
+                nslimit="1",
+                nslimit1="1",
+                mclimit="0.1",
+                searchsize="10",
+                dpi="48",
+                label="DRAFT",
+                labelloc="t",
+                fontcolor="#FF0000",
+                fontsize="24",
+            )
 
-        for connector in self.connectors.values():
-            # If no wires connected (except maybe loop wires)?
-            if not (connector.ports_left or connector.ports_right):
-                connector.ports_left = True  # Use left side pins.
+        # The statements generated for each component are cached, and only
+        # regenerated for components invalidated since the previous call.
+        options = astuple(self.options)
+        if options != self._node_cache_options:
+            self._node_cache.clear()
+            self._node_cache_options = options
+
+        def cache_key(component: Union[Connector, Cable], *args: Any) -> tuple:
+            """Return the values besides the component itself that its statements depend on."""
+            # Additional components in the diagram might refer to BOM entry IDs
+            uses_bom = self.options.mini_bom_mode and component.additional_components
+            return (self._bom_version if uses_bom else None, *args)
+
+        def cached(name: Designator, key: tuple) -> bool:
+            """Append cached statements of the component and return True if valid."""
+            if name in self._node_cache and self._node_cache[name][0] == key:
+                dot.body.extend(self._node_cache[name][1])
+                return True
+            return False
+
+        for connector in self._layout_order(self.connectors.values()):
+            key = cache_key(connector)
+            if not included(connector.name) or cached(connector.name, key):
+                continue
+            body_start = len(dot.body)
+            # If no wires connected (except maybe loop wires), use left side pins.
+            ports_left = connector.ports_left or not connector.ports_right
+            ports_right = connector.ports_right
 
             html = []
             # fmt: off
@@ -203,7 +568,7 @@ class Harness:
                      translate_color(connector.color, self.options.color_mode) if connector.color else None,
                      html_colorbar(connector.color)],
                     '<!-- connector table -->' if connector.style != 'simple' else None,
-                    [html_image(connector.image)],
+                    [html_image(connector.image, draft)],
                     [html_caption(connector.image)]]
             # fmt: on
 
@@ -229,7 +594,7 @@ class Harness:
                         continue
 
                     pinhtml.append("   <tr>")
-                    if connector.ports_left:
+                    if ports_left:
                         pinhtml.append(f'    <td port="p{pinindex+1}l">{pinname}</td>')
                     if pinlabel:
                         pinhtml.append(f"    <td>{pinlabel}</td>")
@@ -246,7 +611,7 @@ class Harness:
                         else:
                             pinhtml.append('    <td colspan="2"></td>')
 
-                    if connector.ports_right:
+                    if ports_right:
                         pinhtml.append(f'    <td port="p{pinindex+1}r">{pinname}</td>')
                     pinhtml.append("   </tr>")
 
@@ -271,10 +636,10 @@ class Harness:
 
             if len(connector.loops) > 0:
                 dot.attr("edge", color="#000000:#ffffff:#000000")
-                if connector.ports_left:
+                if ports_left:
                     loop_side = "l"
                     loop_dir = "w"
-                elif connector.ports_right:
+                elif ports_right:
                     loop_side = "r"
                     loop_dir = "e"
                 else:
@@ -286,6 +651,8 @@ class Harness:
                         label=" ",  # Work-around to avoid over-sized loops.
                     )
 
+            self._node_cache[connector.name] = (key, dot.body[body_start:])
+
         # determine if there are double- or triple-colored wires in the harness;
         # if so, pad single-color wires to make all wires of equal thickness
         pad = any(
@@ -294,7 +661,12 @@ class Harness:
             for colorstr in cable.colors
         )
 
-        for cable in self.cables.values():
+        for cable in self._layout_order(self.cables.values()):
+            # cable statements also depend on the wire padding of the whole harness
+            key = cache_key(cable, pad)
+            if not included(cable.name) or cached(cable.name, key):
+                continue
+            body_start = len(dot.body)
             html = []
 
             awg_fmt = ""
@@ -326,7 +698,7 @@ class Harness:
                      translate_color(cable.color, self.options.color_mode) if cable.color else None,
                      html_colorbar(cable.color)],
                     '<!-- wire table -->',
-                    [html_image(cable.image)],
+                    [html_image(cable.image, draft)],
                     [html_caption(cable.image)]]
             # fmt: on
 
@@ -532,8 +904,12 @@ class Harness:
                 fillcolor=translate_color(bgcolor, "HEX"),
             )
 
+            self._node_cache[cable.name] = (key, dot.body[body_start:])
+
         # mates
         for mate in self.mates:
+            if not included(mate.from_name):
+                continue
             if mate.shape[-1] == ">":
                 dir = "both" if mate.shape[0] == "<" else "forward"
             else:
@@ -564,6 +940,12 @@ class Harness:
             dot.attr("edge", color=color, style="dashed", dir=dir)
             dot.edge(code_from, code_to)
 
+        if self._layout:
+            self._apply_layout(
+                dot,
+                [name for name in [*self.connectors, *self.cables] if included(name)],
+            )
+
         def typecheck(name: str, value: Any, expect: type) -> None:
             if not isinstance(value, expect):
                 raise Exception(
@@ -635,30 +1017,302 @@ class Harness:
 
         return dot
 
-    # cache for the GraphViz Graph object
+    def _layout_order(
+        self, components: Iterable[Union[Connector, Cable]]
+    ) -> List[Union[Connector, Cable]]:
+        """Return the components in the order of their previous layout positions, if any.
+
+        With rankdir=LR, dot orders the nodes of each rank initially by their
+        order in the input, so this helps keeping the previous node order."""
+        if not self._layout:
+            return list(components)
+
+        def position(component: Union[Connector, Cable]) -> tuple:
+            if component.name in self._layout:
+                x, y = self._layout[component.name]["pos"]
+                return (0, x, -y)  # left to right, top to bottom
+            return (1,)  # new components last, in their original order
+
+        return sorted(components, key=position)
+
+    def _node_label_hash(self, name: Designator) -> Optional[str]:
+        """Return a hash of the node statement (without edges) of the component."""
+        for entry in self._node_cache.get(name, (None, []))[1]:
+            head = entry.split(" [", 1)[0].strip()  # skip edges and attributes
+            if head and " -- " not in head and head not in ("edge", "node", "graph"):
+                return hashlib.sha1(entry.encode("utf-8")).hexdigest()
+        return None
+
+    def _apply_layout(self, dot: Graph, names: List[Designator]) -> None:
+        """Pin the nodes to their previous positions if none of them has changed."""
+        if not all(
+            name in self._layout
+            and self._layout[name]["label"] == self._node_label_hash(name)
+            for name in names
+        ):
+            return  # layout by dot, using the node order from _layout_order()
+        # The node sizes are unchanged, so no new layout is needed:
+        # neato only routes the edges between the pinned nodes.
+        dot.engine = "neato"
+        dot.attr("graph", splines="true")
+        for name in names:
+            x, y = self._layout[name]["pos"]
+            dot.node(name, pos=f"{x:g},{y:g}!")
+
+    def load_layout(self, filename: Union[str, Path]) -> None:
+        """Reuse node positions saved by save_layout() for the following renders."""
+        try:
+            self._layout = json.loads(file_read_text(filename))["nodes"]
+        except (OSError, ValueError, KeyError):
+            self._layout = {}
+        self._graph = None
+
+    def save_layout(self, filename: Union[str, Path], plain: str) -> None:
+        """Save the node positions from Graphviz plain output, see load_layout()."""
+        nodes = {
+            name: {"pos": [x, y], "label": self._node_label_hash(name)}
+            for name, (x, y) in parse_plain_positions(plain).items()
+            if name in self.connectors or name in self.cables
+        }
+        file_write_text(filename, json.dumps({"nodes": nodes}, indent=2) + "\n")
+
+    # self._graph caches the GraphViz Graph object
     # do not access directly, use self.graph instead
-    _graph = None
 
     @property
     def graph(self):
-        if not self._graph:  # no cached graph exists, generate one
+        if self._graph is None:  # no cached graph exists, generate one
             self._graph = self.create_graph()
         return self._graph  # return cached graph
 
+    def sheet_groups(self) -> List[Optional[List[Designator]]]:
+        """Return the designators to include on each sheet.
+
+        Connected components are never split between sheets. Components
+        listed in the explicit sheets come first, and the remaining ones
+        are packed into additional sheets of at most options.sheet_max_nodes
+        nodes each. A single None entry means the whole diagram on one sheet,
+        which is also the case when tweak.append is set."""
+        if not self.sheets and not self.options.sheet_max_nodes:
+            return [None]
+        components = self.connected_components()
+        component_of = {
+            name: index
+            for index, component in enumerate(components)
+            for name in component
+        }
+        sheet_of = {}  # component index -> sheet index
+        groups = []
+        for sheet in self.sheets:
+            group = []
+            for name in sheet:
+                if name not in component_of:
+                    raise Exception(f"Unknown designator {name} in sheets")
+                index = component_of[name]
+                if sheet_of.get(index, len(groups)) != len(groups):
+                    raise Exception(
+                        f"{name} is connected to components on sheet {sheet_of[index] + 1}"
+                    )
+                if index not in sheet_of:
+                    sheet_of[index] = len(groups)
+                    group.extend(components[index])
+            groups.append(group)
+        group = []
+        limit = self.options.sheet_max_nodes
+        for index, component in enumerate(components):
+            if index in sheet_of:
+                continue
+            if group and limit and len(group) + len(component) > limit:
+                groups.append(group)
+                group = []
+            group.extend(component)
+        if group:
+            groups.append(group)
+        if len(groups) > 1 and self.tweak.append is not None:
+            # Appended Graphviz code would be repeated on every sheet
+            print("Harness.sheet_groups() warning: tweak.append disables sheets")
+            return [None]
+        return groups if len(groups) > 1 else [None]
+
+    def partial_graphs(
+        self, designators: Optional[List[Designator]] = None
+    ) -> List[Graph]:
+        """Return one graph per independent sub-harness if partitioning, or one graph otherwise.
+
+        The graphs are limited to the listed components, if any."""
+
+        def single_graph() -> List[Graph]:
+            return [
+                self.graph if designators is None else self.create_graph(designators)
+            ]
+
+        if not self.options.partition:
+            return single_graph()
+        if self.tweak.append is not None:
+            # Appended Graphviz code might link nodes of different sub-harnesses
+            print(
+                "Harness.partial_graphs() warning: tweak.append disables partitioning"
+            )
+            return single_graph()
+        components = self.connected_components()
+        if designators is not None:
+            included = set(designators)
+            components = [c for c in components if c[0] in included]
+        if len(components) < 2:
+            return single_graph()
+        return [self.create_graph(component) for component in components]
+
+    def render_sheets(
+        self,
+        formats: Sequence[str],
+        sheets: Optional[List[Optional[List[Designator]]]] = None,
+    ) -> Dict[str, List[bytes]]:
+        """Return each sheet of the diagram rendered in each of the given formats.
+
+        All formats are rendered from one layout per graph, and the graphs of
+        all sheets (and of all sub-harnesses, when partitioning) are rendered
+        in parallel when the render backend allows it."""
+        if sheets is None:
+            sheets = self.sheet_groups()
+        graphs = [self.partial_graphs(sheet) for sheet in sheets]
+        backend = get_render_backend(self.options.render_backend)
+        data = render_parallel(
+            [graph for group in graphs for graph in group], formats, backend
+        )
+        bgcolor = wv_colors.translate_color(self.options.bgcolor, "HEX")
+        output = {fmt: [] for fmt in formats}
+        for group in graphs:
+            parts, data = data[: len(group)], data[len(group) :]
+            for fmt in formats:
+                if len(parts) == 1:
+                    output[fmt].append(parts[0][fmt])
+                elif fmt == "svg":
+                    svgs = [part[fmt].decode("utf-8") for part in parts]
+                    output[fmt].append(compose_svg(svgs, bgcolor).encode("utf-8"))
+                elif fmt == "png":
+                    output[fmt].append(
+                        compose_png([part[fmt] for part in parts], bgcolor)
+                    )
+                elif fmt == "pdf":  # one page per sub-harness
+                    try:
+                        output[fmt].append(compose_pdf([part[fmt] for part in parts]))
+                    except ImportError:
+                        raise Exception("Partitioned PDF output requires pypdf")
+                elif fmt == "plain":  # only used for reading node positions
+                    output[fmt].append(b"".join(part[fmt] for part in parts))
+                else:
+                    raise ValueError(f"Partitioned output is not supported for {fmt}")
+        return output
+
+    def pipe_sheets(
+        self, fmt: str, sheets: Optional[List[Optional[List[Designator]]]] = None
+    ) -> List[bytes]:
+        """Return each sheet of the diagram rendered in the given format."""
+        return self.render_sheets([fmt], sheets)[fmt]
+
+    def pipe(self, fmt: str) -> bytes:
+        """Return the whole diagram rendered in the given format."""
+        return self.pipe_sheets(fmt, [None])[0]
+
     @property
     def png(self):
-        from io import BytesIO
-
-        graph = self.graph
-        data = BytesIO()
-        data.write(graph.pipe(format="png"))
-        data.seek(0)
-        return data.read()
+        return self.pipe("png")
 
     @property
     def svg(self):  # TODO?: Verify xml encoding="utf-8" in SVG?
-        graph = self.graph
-        return embed_svg_images(graph.pipe(format="svg").decode("utf-8"), Path.cwd())
+        return embed_svg_images(
+            self.pipe("svg").decode("utf-8"), Path.cwd(), self.options.image_dpi
+        )
+
+    def bom_graph(self) -> Graph:
+        """Return a graph showing the BOM as a table, e.g. for a PDF page."""
+        bom = flatten2d(bom_list(self.bom()))
+        rows = [
+            "<tr>" + "".join(f"<td><b>{escape(item)}</b></td>" for item in bom[0]),
+            *(
+                "<tr>"
+                + "".join(f'<td align="left">{escape(item)}</td>' for item in row)
+                for row in bom[1:]
+            ),
+        ]
+        table = '<table border="0" cellborder="1" cellspacing="0" cellpadding="4">'
+        table += "</tr>".join(rows) + "</tr></table>"
+        dot = Graph()
+        dot.attr(
+            "graph",
+            bgcolor=wv_colors.translate_color(self.options.bgcolor, "HEX"),
+            fontname=self.options.fontname,
+            label=self.metadata.get("title", ""),
+            labelloc="t",
+        )
+        dot.node("BOM", f"<{table}>", shape="plaintext", fontname=self.options.fontname)
+        return dot
+
+    def pdf_document(self, sheets_pdf: Optional[List[bytes]] = None) -> bytes:
+        """Return the diagram sheets followed by a BOM page as one PDF document.
+
+        The pages are merged with the optional pypdf package. Without it, only
+        the diagram is returned, which must fit on a single sheet."""
+        if sheets_pdf is None:
+            sheets_pdf = self.pipe_sheets("pdf")
+        try:
+            import pypdf  # noqa: F401 (only checks availability)
+        except ImportError:
+            if len(sheets_pdf) > 1:
+                raise Exception("PDF output of multiple sheets requires pypdf")
+            print(
+                "Harness.pdf_document() warning: install pypdf to add "
+                "the BOM to the PDF output"
+            )
+            return sheets_pdf[0]
+        backend = get_render_backend(self.options.render_backend)
+        bom_pdf = backend.render(self.bom_graph(), ["pdf"])["pdf"]
+        return compose_pdf([*sheets_pdf, bom_pdf])
+
+    def write(self, fmt: str, out: BinaryIO) -> None:
+        """Write the whole diagram or the BOM in the given format to a binary stream.
+
+        Supported formats are gv, net, netjson, pdf, png, svg (with embedded
+        images) and tsv."""
+        if fmt == "gv":
+            out.write(self.graph.source.encode("utf-8"))
+        elif fmt in ("net", "netjson"):
+            out.write(self.netlist_text(fmt).encode("utf-8"))
+        elif fmt == "tsv":
+            out.write(tuplelist2tsv(bom_list(self.bom())).encode("utf-8"))
+        elif fmt == "pdf":
+            out.write(self.pdf_document())
+        elif fmt == "png":
+            graphs = self.partial_graphs()
+            if len(graphs) == 1:  # stream directly from Graphviz
+                get_render_backend(self.options.render_backend).write(
+                    graphs[0], fmt, out
+                )
+            else:
+                out.write(self.pipe(fmt))
+        elif fmt == "svg":
+            svg = self.pipe(fmt).decode("utf-8")
+            text = TextIOWrapper(out, encoding="utf-8", write_through=True)
+            try:
+                embed_svg_images_stream(
+                    lambda: StringIO(svg), text, Path.cwd(), self.options.image_dpi
+                )
+            finally:
+                text.detach()  # leave out open
+        else:
+            raise Exception(f"Writing {fmt} output to a stream is not supported")
+
+    def sheet_names(
+        self,
+        filename: (str, Path),
+        sheets: Optional[List[Optional[List[Designator]]]] = None,
+    ) -> List[str]:
+        """Return the file names (without extension) of the diagram files of each sheet."""
+        if sheets is None:
+            sheets = self.sheet_groups()
+        if len(sheets) > 1:  # one set of diagram files per sheet
+            return [f"{filename}.sheet{n}" for n in range(1, len(sheets) + 1)]
+        return [str(filename)]
 
     def output(
         self,
@@ -667,49 +1321,78 @@ class Harness:
         cleanup: bool = True,
         fmt: tuple = ("html", "png", "svg", "tsv"),
     ) -> None:
+        if isinstance(fmt, str):  # a single format, e.g. "net" (not in "netjson")
+            fmt = (fmt,)
+        layout_file = f"{filename}.layout.json"
+        if self.options.reuse_layout:
+            self.load_layout(layout_file)
         # graphical output
         graph = self.graph
-        svg_already_exists = Path(
-            f"{filename}.svg"
-        ).exists()  # if SVG already exists, do not delete later
+        sheets = self.sheet_groups()
+        sheet_names = self.sheet_names(filename, sheets)
         # graphical output
-        for f in fmt:
-            if f in ("png", "svg", "html"):
-                if f == "html":  # if HTML format is specified,
-                    f = "svg"  # generate SVG for embedding into HTML
-                # SVG file will be renamed/deleted later
-                _filename = f"{filename}.tmp" if f == "svg" else filename
-                # TODO: prevent rendering SVG twice when both SVG and HTML are specified
-                graph.format = f
-                graph.render(filename=_filename, view=view, cleanup=cleanup)
+        graphical_formats = []
+        if "svg" in fmt or "html" in fmt:  # generate SVG for embedding into HTML
+            graphical_formats.append("svg")
+        if "png" in fmt:
+            graphical_formats.append("png")
+        if "pdf" in fmt:  # from the same layout as SVG and PNG
+            graphical_formats.append("pdf")
+        if graphical_formats and self.options.reuse_layout:
+            graphical_formats.append("plain")  # node positions for the next render
+        if graphical_formats:
+            rendered = self.render_sheets(graphical_formats, sheets)
+            if "plain" in rendered:
+                plain = b"".join(rendered["plain"]).decode("utf-8")
+                self.save_layout(layout_file, plain)
+            for name, data in zip(sheet_names, rendered.get("svg", [])):
+                # temporary SVG file will be copied/deleted later
+                Path(f"{name}.tmp.svg").write_bytes(data)
+            for name, data in zip(sheet_names, rendered.get("png", [])):
+                file_write_bytes(f"{name}.png", data)
         # embed images into SVG output
         if "svg" in fmt or "html" in fmt:
-            embed_svg_images_file(f"{filename}.tmp.svg")
+            for name in sheet_names:
+                embed_svg_images_file(
+                    f"{name}.tmp.svg", image_dpi=self.options.image_dpi
+                )
         # GraphViz output
         if "gv" in fmt:
-            graph.save(filename=f"{filename}.gv")
+            file_write_text(f"{filename}.gv", graph.source)
         # BOM output
         bomlist = bom_list(self.bom())
         if "tsv" in fmt:
             file_write_text(f"{filename}.bom.tsv", tuplelist2tsv(bomlist))
+        # netlist output
+        if "net" in fmt:
+            file_write_text(f"{filename}.net.tsv", self.netlist_text("net"))
+        if "netjson" in fmt:
+            file_write_text(f"{filename}.net.json", self.netlist_text("netjson"))
         if "csv" in fmt:
             # TODO: implement CSV output (preferrably using CSV library)
             print("CSV output is not yet supported")
         # HTML output
         if "html" in fmt:
-            generate_html_output(filename, bomlist, self.metadata, self.options)
+            generate_html_output(
+                filename, bomlist, self.metadata, self.options, sheet_names
+            )
         # PDF output
         if "pdf" in fmt:
-            # TODO: implement PDF output
-            print("PDF output is not yet supported")
+            file_write_bytes(f"{filename}.pdf", self.pdf_document(rendered["pdf"]))
         # delete SVG if not needed
-        if "html" in fmt and not "svg" in fmt:
-            # SVG file was just needed to generate HTML
-            Path(f"{filename}.tmp.svg").unlink()
-        elif "svg" in fmt:
-            Path(f"{filename}.tmp.svg").replace(f"{filename}.svg")
+        for name in sheet_names:
+            if "html" in fmt and not "svg" in fmt:
+                # SVG file was just needed to generate HTML
+                Path(f"{name}.tmp.svg").unlink()
+            elif "svg" in fmt:
+                file_replace(f"{name}.tmp.svg", f"{name}.svg")
+        if view:
+            for f in ("svg", "png"):
+                if f in fmt:
+                    graphviz.view(f"{sheet_names[0]}.{f}")
+                    break
 
     def bom(self):
-        if not self._bom:
+        if self._bom is None:
             self._bom = generate_bom(self)
         return self._bom
@@ -1,12 +1,54 @@
 # -*- coding: utf-8 -*-
 
 import base64
+import hashlib
+import math
 import re
+from collections import Counter
+from io import BytesIO, StringIO
 from pathlib import Path
-from typing import Union
+from typing import Callable, Dict, Iterator, Optional, TextIO, Tuple, Union
 
 mime_subtype_replacements = {"jpg": "jpeg", "tif": "tiff"}
 
+# Number of bytes saved by embedding repeated images only once
+svg_embed_stats = {"bytes_saved": 0}
+
+# Downscaled image data by source image hash and target size in pixels
+_downscaled_images: Dict[Tuple[str, Tuple[int, int]], bytes] = {}
+
+
+def downscale_image(image: bytes, size: Tuple[int, int]) -> bytes:
+    """Return the image data resampled to fit within size (in pixels).
+
+    Images that already fit are returned unchanged, as are images that
+    cannot be resampled (e.g. when Pillow is not installed)."""
+    key = (hashlib.sha1(image).hexdigest(), size)
+    if key not in _downscaled_images:
+        _downscaled_images[key] = image
+        try:
+            from PIL import Image
+
+            with Image.open(BytesIO(image)) as img:
+                scale = min(size[0] / img.width, size[1] / img.height)
+                if scale < 1:
+                    fmt = img.format
+                    resized = img.resize(
+                        (
+                            max(1, round(img.width * scale)),
+                            max(1, round(img.height * scale)),
+                        ),
+                        Image.LANCZOS,
+                    )
+                    data = BytesIO()
+                    resized.save(data, format=fmt)
+                    if data.tell() < len(image):
+                        _downscaled_images[key] = data.getvalue()
+        # ModuleNotFoundError is the most expected, but all are handled equally.
+        except Exception as error:
+            print(f"downscale_image(): {type(error).__name__}: {error}")
+    return _downscaled_images[key]
+
 
 # TODO: Share cache and code between data_URI_base64() and embed_svg_images()
 def data_URI_base64(file: Union[str, Path], media: str = "image") -> str:
@@ -22,29 +64,176 @@ def data_URI_base64(file: Union[str, Path], media: str = "image") -> str:
     return uri
 
 
-def embed_svg_images(svg_in: str, base_path: Union[str, Path] = Path.cwd()) -> str:
-    images_b64 = {}  # cache of base64-encoded images
+# Size of the chunks to read SVG text and image data in
+CHUNK_SIZE = 1 << 16
 
-    def image_tag(pre: str, url: str, post: str) -> str:
-        return f'<image{pre} xlink:href="{url}"{post}>'
+IMAGE_TAG = re.compile(
+    r'<image(?P<PRE> [^>]*?)? xlink:href="(?P<URL>[^"]*?)"(?P<POST> [^>]*?)?>',
+    re.IGNORECASE,
+)
+SVG_TAG = re.compile(r"<svg\b[^>]*>", re.IGNORECASE)
+TAG_START = re.compile(r"<(?:image|svg)\b", re.IGNORECASE)
+PRESERVE_ASPECT_RATIO = re.compile(r'\s+preserveAspectRatio="([^"]*)"', re.IGNORECASE)
+
+
+def svg_parts(svg: TextIO) -> Iterator[Union[str, re.Match]]:
+    """Yield the SVG text read in chunks, split into <image> and <svg> tag matches and the text between them."""
+    buffer = ""
+    eof = False
+    while True:
+        start = TAG_START.search(buffer)
+        if start:
+            # A complete tag ends with ">"; otherwise more text is needed
+            if eof or ">" in buffer[start.start() :]:
+                pattern = SVG_TAG if buffer[start.start() + 1] in "sS" else IMAGE_TAG
+                match = pattern.match(buffer, start.start())
+                end = match.end() if match else start.end()
+                yield buffer[: start.start()]
+                yield match or buffer[start.start() : end]
+                buffer = buffer[end:]
+                continue
+        elif not eof:
+            # Keep the end of the buffer in case it contains the start of a tag
+            keep = buffer.rfind("<")
+            if keep >= 0 and len(buffer) - keep < len("<image"):
+                yield buffer[:keep]
+                buffer = buffer[keep:]
+            else:
+                yield buffer
+                buffer = ""
+        if eof:
+            yield buffer
+            return
+        chunk = svg.read(CHUNK_SIZE)
+        eof = not chunk
+        buffer += chunk
+
+
+def is_image_match(part: Union[str, re.Match]) -> bool:
+    return isinstance(part, re.Match) and part.re is IMAGE_TAG
+
+
+def write_base64(out: TextIO, image: Union[bytes, Path]) -> int:
+    """Write the image data, or the contents of the image file, base64-encoded in chunks and return the number of characters."""
+    written = 0
+    if isinstance(image, bytes):
+        image = BytesIO(image)
+    else:
+        image = open(image, "rb")
+    with image:
+        # Chunks of a multiple of 3 bytes are encoded without padding
+        for data in iter(lambda: image.read(max(3, CHUNK_SIZE // 4 * 3)), b""):
+            written += out.write(base64.b64encode(data).decode("ascii"))
+    return written
 
-    def replace(match: re.Match) -> str:
-        imgurl = match["URL"]
-        if not imgurl in images_b64:  # only encode/cache every unique URL once
-            imgurl_abs = (Path(base_path) / imgurl).resolve()
-            image = imgurl_abs.read_bytes()
-            images_b64[imgurl] = base64.b64encode(image).decode("utf-8")
-        return image_tag(
-            match["PRE"] or "",
-            f"data:image/{get_mime_subtype(imgurl)};base64, {images_b64[imgurl]}",
-            match["POST"] or "",
-        )
 
-    pattern = re.compile(
-        image_tag(r"(?P<PRE> [^>]*?)?", r'(?P<URL>[^"]*?)', r"(?P<POST> [^>]*?)?"),
-        re.IGNORECASE,
-    )
-    return pattern.sub(replace, svg_in)
+def embed_svg_images_stream(
+    open_svg: Callable[[], TextIO],
+    out: TextIO,
+    base_path: Union[str, Path] = Path.cwd(),
+    image_dpi: Optional[int] = None,
+) -> None:
+    """Write the SVG with all linked images embedded as data URIs to out.
+
+    The SVG is read twice with open_svg(), in chunks: first to find the
+    images used more than once, then to write the output, so that neither
+    the SVG nor the base64 data is ever completely in memory.
+
+    Images used more than once are embedded once as a symbol, and each
+    occurrence becomes a <use> element. If image_dpi is given, images are
+    downscaled to their displayed size at that resolution before embedding."""
+
+    def target_size(attrs: str) -> Optional[Tuple[int, int]]:
+        """Return the displayed size of the image in pixels at image_dpi."""
+        if not image_dpi:
+            return None
+        size = [re.search(rf'\b{dim}="([0-9.]+)', attrs) for dim in ("width", "height")]
+        if not all(size):
+            return None
+        # SVG user units from Graphviz are points (1/72 inch)
+        return tuple(math.ceil(float(dim[1]) * image_dpi / 72) for dim in size)
+
+    def symbol_key(match: re.Match) -> tuple:
+        attrs = f"{match['PRE']}{match['POST']}"
+        par = PRESERVE_ASPECT_RATIO.search(attrs)
+        return (match["URL"], par and par[1], target_size(attrs))
+
+    def write_data_uri(url: str, size: Optional[Tuple[int, int]]) -> int:
+        image = (Path(base_path) / url).resolve()
+        if size:
+            image = downscale_image(image.read_bytes(), size)
+        written = out.write(f"data:image/{get_mime_subtype(url)};base64, ")
+        return written + write_base64(out, image)
+
+    def write_image(pre: str, url: str, post: str, size) -> int:
+        written = out.write(f'<image{pre} xlink:href="')
+        written += write_data_uri(url, size)
+        return written + out.write(f'"{post}>')
+
+    counts = Counter()  # number of self-closing <image> tags per symbol key
+    has_svg_tag = False  # symbols must be defined inside the <svg> element
+    with open_svg() as svg:
+        for part in svg_parts(svg):
+            if is_image_match(part) and (part["POST"] or "").endswith("/"):
+                counts[symbol_key(part)] += 1
+            elif isinstance(part, re.Match) and not is_image_match(part):
+                has_svg_tag = True
+    symbols = {}  # symbol id of each image used more than once
+    for key, count in counts.items():
+        if count > 1 and has_svg_tag:
+            symbols[key] = "wvimg-" + hashlib.sha1(repr(key).encode()).hexdigest()[:12]
+    uri_lengths = {}  # length of the data URI of each symbol
+
+    bytes_saved = 0
+    defs_written = not symbols
+    with open_svg() as svg:
+        for part in svg_parts(svg):
+            if isinstance(part, str):
+                out.write(part)
+            elif not is_image_match(part):  # <svg> start tag
+                out.write(part[0])
+                if not defs_written:
+                    # Embed repeated images once, sized by each <use> element
+                    bytes_saved -= out.write("\n<defs>")
+                    for (url, par, size), symbol_id in symbols.items():
+                        par_attr = f' preserveAspectRatio="{par}"' if par else ""
+                        bytes_saved -= out.write(
+                            f'\n<symbol id="{symbol_id}"><image xlink:href="'
+                        )
+                        uri_lengths[url, par, size] = write_data_uri(url, size)
+                        bytes_saved -= uri_lengths[url, par, size]
+                        bytes_saved -= out.write(
+                            f'" width="100%" height="100%"{par_attr}/></symbol>'
+                        )
+                    bytes_saved -= out.write("\n</defs>")
+                    defs_written = True
+            else:
+                pre, post = part["PRE"] or "", part["POST"] or ""
+                key = symbol_key(part)
+                if key in symbols and post.endswith("/"):
+                    attrs = PRESERVE_ASPECT_RATIO.sub("", pre + post)
+                    bytes_saved -= out.write(
+                        f'<use xlink:href="#{symbols[key]}"{attrs}>'
+                    )
+                    # size of the <image> element with the data URI instead
+                    bytes_saved += len(f'<image{pre} xlink:href=""{post}>')
+                    bytes_saved += uri_lengths[key]
+                else:
+                    write_image(pre, part["URL"], post, key[2])
+    svg_embed_stats["bytes_saved"] += bytes_saved
+
+
+def embed_svg_images(
+    svg_in: str,
+    base_path: Union[str, Path] = Path.cwd(),
+    image_dpi: Optional[int] = None,
+) -> str:
+    """Return the SVG with all linked images embedded as data URIs.
+
+    See embed_svg_images_stream() for details."""
+    out = StringIO()
+    embed_svg_images_stream(lambda: StringIO(svg_in), out, base_path, image_dpi)
+    return out.getvalue()
 
 
 def get_mime_subtype(filename: Union[str, Path]) -> str:
@@ -55,12 +244,19 @@ def get_mime_subtype(filename: Union[str, Path]) -> str:
 
 
 def embed_svg_images_file(
-    filename_in: Union[str, Path], overwrite: bool = True
+    filename_in: Union[str, Path],
+    overwrite: bool = True,
+    image_dpi: Optional[int] = None,
 ) -> None:
     filename_in = Path(filename_in).resolve()
     filename_out = filename_in.with_suffix(".b64.svg")
-    filename_out.write_text(  # TODO?: Verify xml encoding="utf-8" in SVG?
-        embed_svg_images(filename_in.read_text(), filename_in.parent)
-    )  # TODO: Use encoding="utf-8" in both read_text() and write_text()
+    # TODO?: Verify xml encoding="utf-8" in SVG?
+    with open(filename_out, "w", encoding="utf-8") as out:
+        embed_svg_images_stream(
+            lambda: open(filename_in, encoding="utf-8"),
+            out,
+            filename_in.parent,
+            image_dpi,
+        )
     if overwrite:
         filename_out.replace(filename_in)
@@ -13,6 +13,11 @@ if __name__ == "__main__":
 
 from wireviz.DataClasses import Metadata, Options, Tweak
 from wireviz.Harness import Harness
+from wireviz.wv_cache import (
+    harness_cache_key,
+    load_cached_harness,
+    save_cached_harness,
+)
 from wireviz.wv_helper import (
     expand,
     file_read_text,
@@ -31,6 +36,8 @@ def parse(
     output_dir: Union[str, Path] = None,
     output_name: Union[None, str] = None,
     image_paths: Union[Path, str, List] = [],
+    options: Union[None, Dict] = None,
+    cache_dir: Union[None, str, Path] = None,
 ) -> Any:
     """
     This function takes an input, parses it as a WireViz Harness file,
@@ -50,6 +57,8 @@ def parse(
         * "csv":  the BOM, as a comma-separated text file
         * "gv":   the diagram, as a GraphViz source file
         * "html": the diagram and (depending on the template) the BOM, as a HTML file
+        * "net":  the netlist (connected connector pins), as a tab-separated text file
+        * "netjson": the netlist, as a JSON file
         * "png":  the diagram, as a PNG raster image
         * "pdf":  the diagram and (depending on the template) the BOM, as a PDF file
         * "svg":  the diagram, as a SVG vector image
@@ -75,6 +84,13 @@ def parse(
             Paths to use when resolving any image paths included in the data.
             Note: If inp is a path to a YAML file,
             its parent directory will automatically be included in the list.
+        options (Dict, optional):
+            Options overriding those in the options section of the data,
+            e.g. {"render_profile": "draft"}.
+        cache_dir (Path | str, optional):
+            Directory to cache populated harnesses in, keyed by the hash of the
+            YAML input, options and image paths. Repeated runs with unchanged
+            input load the cached harness instead of parsing the YAML input.
 
     Returns:
         Depending on the return_types parameter, may return:
@@ -88,11 +104,10 @@ def parse(
     if not output_formats and not return_types:
         raise Exception("No output formats or return types specified")
 
-    yaml_data, yaml_file = _get_yaml_data_and_path(inp)
-    if not isinstance(yaml_data, dict):
-        raise TypeError(
-            f"Expected a dict as top-level YAML input, but got: {type(yaml_data)}"
-        )
+    yaml_input, yaml_file = _get_yaml_input_and_path(inp)
+    if isinstance(image_paths, (str, Path)):
+        image_paths = [image_paths]
+    image_paths = list(image_paths)  # do not modify the caller's list
     if output_formats:
         # need to write data to file, determine output directory and filename
         output_dir = _get_output_dir(yaml_file, output_dir)
@@ -105,6 +120,54 @@ def parse(
         if not default_image_path in [Path(x).resolve() for x in image_paths]:
             image_paths.append(default_image_path)
 
+    harness = None
+    save_to_cache = False
+    if cache_dir and isinstance(yaml_input, str):  # Dict input is not cached
+        cache_key = harness_cache_key(yaml_input, options, image_paths, output_name)
+        harness = load_cached_harness(cache_dir, cache_key)
+        save_to_cache = harness is None
+    if harness is None:
+        yaml_data = (
+            yaml.safe_load(yaml_input) if isinstance(yaml_input, str) else yaml_input
+        )
+        if not isinstance(yaml_data, dict):
+            raise TypeError(
+                f"Expected a dict as top-level YAML input, but got: {type(yaml_data)}"
+            )
+        harness = _build_harness(yaml_data, options, output_name, image_paths)
+
+    if output_formats:
+        harness.output(filename=output_file, fmt=output_formats, view=False)
+
+    if save_to_cache:
+        # after output, to include the generated BOM
+        save_cached_harness(cache_dir, cache_key, harness)
+
+    if return_types:
+        returns = []
+        if isinstance(return_types, str):  # only one return type speficied
+            return_types = [return_types]
+
+        return_types = [t.lower() for t in return_types]
+
+        for rt in return_types:
+            if rt == "png":
+                returns.append(harness.png)
+            if rt == "svg":
+                returns.append(harness.svg)
+            if rt == "harness":
+                returns.append(harness)
+
+        return tuple(returns) if len(returns) != 1 else returns[0]
+
+
+def _build_harness(
+    yaml_data: Dict,
+    options: Union[None, Dict],
+    output_name: Union[None, str],
+    image_paths: List,
+) -> Harness:
+    """Return a new harness populated from the parsed YAML data."""
     # define variables =========================================================
     # containers for parsed component data and connection sets
     template_connectors = {}
@@ -113,7 +176,7 @@ def parse(
     # actual harness
     harness = Harness(
         metadata=Metadata(**yaml_data.get("metadata", {})),
-        options=Options(**yaml_data.get("options", {})),
+        options=Options(**{**yaml_data.get("options", {}), **(options or {})}),
         tweak=Tweak(**yaml_data.get("tweak", {})),
     )
     # others
@@ -136,15 +199,8 @@ def parse(
             if len(yaml_data[sec]) > 0:  # section has contents
                 if ty == dict:
                     for key, attribs in yaml_data[sec].items():
-                        # The Image dataclass might need to open an image file with a relative path.
-                        image = attribs.get("image")
-                        if isinstance(image, dict):
-                            image_path = image["src"]
-                            if image_path and not Path(image_path).is_absolute():
-                                # resolve relative image path
-                                image["src"] = smart_file_resolve(
-                                    image_path, image_paths
-                                )
+                        # Image paths are resolved by instantiate() below,
+                        # only for templates that are actually used.
                         if sec == "connectors":
                             template_connectors[key] = attribs
                         elif sec == "cables":
@@ -159,6 +215,17 @@ def parse(
 
     connection_sets = yaml_data["connections"]
 
+    def instantiate(attribs):
+        # The Image dataclass might need to open an image file with a relative path.
+        image = attribs.get("image")
+        if isinstance(image, dict):
+            image_path = image["src"]
+            if image_path and not Path(image_path).is_absolute():
+                # resolve relative image path (only once per template,
+                # since the resolved path is absolute)
+                image["src"] = smart_file_resolve(image_path, image_paths)
+        return attribs
+
     # go through connection sets, generate and connect components ==============
 
     template_separator_char = harness.options.template_separator
@@ -289,7 +356,7 @@ def parse(
                     # generate new connector instance from template
                     check_type(designator, template, "connector")
                     harness.add_connector(
-                        name=designator, **template_connectors[template]
+                        name=designator, **instantiate(template_connectors[template])
                     )
 
                 elif designator in harness.cables:  # existing cable instance
@@ -297,7 +364,9 @@ def parse(
                 elif template in template_cables.keys():
                     # generate new cable instance from template
                     check_type(designator, template, "cable/arrow")
-                    harness.add_cable(name=designator, **template_cables[template])
+                    harness.add_cable(
+                        name=designator, **instantiate(template_cables[template])
+                    )
 
                 elif is_arrow(designator):
                     check_type(designator, template, "cable/arrow")
@@ -381,29 +450,16 @@ def parse(
         for line in yaml_data["additional_bom_items"]:
             harness.add_bom_item(line)
 
-    if output_formats:
-        harness.output(filename=output_file, fmt=output_formats, view=False)
-
-    if return_types:
-        returns = []
-        if isinstance(return_types, str):  # only one return type speficied
-            return_types = [return_types]
+    if "sheets" in yaml_data:
+        for sheet in yaml_data["sheets"]:
+            harness.add_sheet(sheet)
 
-        return_types = [t.lower() for t in return_types]
-
-        for rt in return_types:
-            if rt == "png":
-                returns.append(harness.png)
-            if rt == "svg":
-                returns.append(harness.svg)
-            if rt == "harness":
-                returns.append(harness)
-
-        return tuple(returns) if len(returns) != 1 else returns[0]
+    return harness
 
 
-def _get_yaml_data_and_path(inp: Union[str, Path, Dict]) -> (Dict, Path):
+def _get_yaml_input_and_path(inp: Union[str, Path, Dict]) -> (Union[str, Dict], Path):
     # determine whether inp is a file path, a YAML string, or a Dict
+    # (the YAML string is returned as-is, to be parsed by the caller)
     if not isinstance(inp, Dict):  # received a str or a Path
         try:
             yaml_path = Path(inp).expanduser().resolve(strict=True)
@@ -427,12 +483,10 @@ def _get_yaml_data_and_path(inp: Union[str, Path, Dict]) -> (Dict, Path):
             # file does not exist; assume inp is a YAML string
             yaml_str = inp
             yaml_path = None
-        yaml_data = yaml.safe_load(yaml_str)
+        return yaml_str, yaml_path
     else:
         # received a Dict, use as-is
-        yaml_data = inp
-        yaml_path = None
-    return yaml_data, yaml_path
+        return inp, None
 
 
 def _get_output_dir(input_file: Path, default_output_dir: Path) -> Path:
@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 
 from dataclasses import asdict
-from itertools import groupby
 from typing import Any, Dict, List, Optional, Tuple, Union
 
 from wireviz.DataClasses import AdditionalComponent, Cable, Color, Connector
@@ -24,8 +23,8 @@ BOMEntry = Dict[BOMColumn, Union[str, int, float, List[str], None]]
 
 def optional_fields(part: Union[Connector, Cable, AdditionalComponent]) -> BOMEntry:
     """Return part field values for the optional BOM columns as a dict."""
-    part = asdict(part)
-    return {field: part.get(field) for field in BOM_COLUMNS_OPTIONAL}
+    # getattr() instead of asdict() avoids deep-copying all fields of the part
+    return {field: getattr(part, field, None) for field in BOM_COLUMNS_OPTIONAL}
 
 
 def get_additional_component_table(
@@ -89,12 +88,15 @@ def get_additional_component_bom(component: Union[Connector, Cable]) -> List[BOM
 def bom_entry_key(entry: BOMEntry) -> BOMKey:
     """Return a tuple of string values from the dict that must be equal to join BOM entries."""
     if "key" not in entry:
-        entry["key"] = tuple(
-            clean_whitespace(make_str(entry.get(c))) for c in BOM_COLUMNS_IN_KEY
-        )
+        entry["key"] = make_bom_entry_key(entry)
     return entry["key"]
 
 
+def make_bom_entry_key(entry: BOMEntry) -> BOMKey:
+    """Return the key of bom_entry_key() without caching it in the dict."""
+    return tuple(clean_whitespace(make_str(entry.get(c))) for c in BOM_COLUMNS_IN_KEY)
+
+
 def generate_bom(harness: "Harness") -> List[BOMEntry]:
     """Return a list of BOM entries generated from the harness."""
     from wireviz.Harness import Harness  # Local import to avoid circular imports
@@ -158,6 +160,7 @@ def generate_bom(harness: "Harness") -> List[BOMEntry]:
                 )
             else:
                 # add each wire from the bundle to the bom
+                cable_fields = optional_fields(cable)
                 for index, color in enumerate(cable.colors):
                     description = (
                         "Wire"
@@ -177,7 +180,7 @@ def generate_bom(harness: "Harness") -> List[BOMEntry]:
                             "designators": cable.name if cable.show_name else None,
                             **{
                                 k: index_if_list(v, index)
-                                for k, v in optional_fields(cable).items()
+                                for k, v in cable_fields.items()
                             },
                         }
                     )
@@ -188,26 +191,29 @@ def generate_bom(harness: "Harness") -> List[BOMEntry]:
     # add harness aditional components to bom directly, as they both are List[BOMEntry]
     bom_entries.extend(harness.additional_bom_items)
 
-    # remove line breaks if present and cleanup any resulting whitespace issues
-    bom_entries = [
-        {k: clean_whitespace(v) for k, v in entry.items()} for entry in bom_entries
-    ]
+    # deduplicate bom in one pass, joining entries with equal keys
+    groups = {}  # key -> [first entry, total qty, set of designators]
+    for entry in bom_entries:
+        # the key is computed from cleaned-up values, so entries can be
+        # cleaned up only when they start a new group
+        key = make_bom_entry_key(entry)
+        group = groups.get(key)
+        if group is None:
+            # remove line breaks if present and cleanup any resulting whitespace issues
+            entry = {k: clean_whitespace(v) for k, v in entry.items()}
+            entry["key"] = key
+            group = groups[key] = [entry, 0, set()]
+        group[1] += entry.get("qty", 1)
+        group[2].update(make_list(clean_whitespace(entry.get("designators"))))
 
-    # deduplicate bom
     bom = []
-    for _, group in groupby(sorted(bom_entries, key=bom_entry_key), key=bom_entry_key):
-        group_entries = list(group)
-        designators = sum(
-            (make_list(entry.get("designators")) for entry in group_entries), []
-        )
-        total_qty = sum(entry.get("qty", 1) for entry in group_entries)
+    for key in sorted(groups):
+        first_entry, total_qty, designators = groups[key]
         bom.append(
             {
-                **group_entries[0],
-                "qty": int(total_qty)
-                if float(total_qty).is_integer()
-                else round(total_qty, 3),
-                "designators": sorted(set(designators)),
+                **first_entry,
+                "qty": round_qty(total_qty),
+                "designators": sorted(designators),
             }
         )
 
@@ -223,13 +229,58 @@ def get_bom_index(bom: List[BOMEntry], target: BOMKey) -> int:
     raise Exception("Internal error: No BOM entry found matching: " + "|".join(target))
 
 
-def bom_list(bom: List[BOMEntry]) -> List[List[str]]:
+def merge_bom(
+    project_bom: Dict[BOMKey, BOMEntry], harness_name: str, bom: List[BOMEntry]
+) -> None:
+    """Add the entries of a harness BOM to a project BOM, joining entries with equal keys.
+
+    Designators are prefixed by the harness name, and the quantity of each
+    harness is tracked in the "harnesses" dict of the project BOM entry."""
+    for entry in bom:
+        key = bom_entry_key(entry)
+        merged = project_bom.get(key)
+        if merged is None:
+            merged = {**entry, "qty": 0, "designators": [], "harnesses": {}}
+            del merged["id"]
+            project_bom[key] = merged
+        qty = entry.get("qty", 1)
+        merged["qty"] += qty
+        merged["harnesses"][harness_name] = (
+            merged["harnesses"].get(harness_name, 0) + qty
+        )
+        merged["designators"].extend(
+            f"{harness_name}/{designator}"
+            for designator in make_list(entry.get("designators"))
+        )
+
+
+def project_bom_list(project_bom: Dict[BOMKey, BOMEntry]) -> List[List[str]]:
+    """Return the project BOM rows like bom_list(), with the quantity of each harness in an extra column."""
+    bom = [
+        {
+            **project_bom[key],
+            "id": index,
+            "qty": round_qty(project_bom[key]["qty"]),
+            "harnesses": [
+                f"{name}: {round_qty(qty)}"
+                for name, qty in project_bom[key]["harnesses"].items()
+            ],
+        }
+        for index, key in enumerate(sorted(project_bom), 1)
+    ]
+    return bom_list(bom, extra_columns=("harnesses",))
+
+
+def bom_list(
+    bom: List[BOMEntry], extra_columns: Tuple[str, ...] = ()
+) -> List[List[str]]:
     """Return list of BOM rows as lists of column strings with headings in top row."""
     keys = list(BOM_COLUMNS_ALWAYS)  # Always include this fixed set of BOM columns.
     for fieldname in BOM_COLUMNS_OPTIONAL:
         # Include only those optional BOM columns that are in use.
         if any(entry.get(fieldname) for entry in bom):
             keys.append(fieldname)
+    keys.extend(extra_columns)
     # Custom mapping from internal name to BOM column headers.
     # Headers not specified here are generated by capitilising the internal name.
     bom_headings = {
@@ -286,6 +337,11 @@ def pn_info_string(
         return None
 
 
+def round_qty(qty: Union[int, float]) -> Union[int, float]:
+    """Return qty as an int if it is integer, or rounded to 3 decimals otherwise."""
+    return int(qty) if float(qty).is_integer() else round(qty, 3)
+
+
 def index_if_list(value: Any, index: int) -> Any:
     """Return the value indexed if it is a list, or simply the value otherwise."""
     return value[index] if isinstance(value, list) else value
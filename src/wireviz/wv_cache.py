@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+import json
+import pickle
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from wireviz import __version__
+from wireviz.wv_helper import open_file_replace
+from wireviz.wv_manifest import file_hash, harness_image_files, text_hash
+
+# Incremented whenever the pickled contents of a Harness change incompatibly
+HARNESS_CACHE_FORMAT = 1
+
+
+def harness_cache_key(
+    yaml_input: str,
+    options: Optional[Dict],
+    image_paths: List[Union[str, Path]],
+    output_name: Optional[str],
+) -> str:
+    """Return the hash of everything the parsed harness depends on, besides image files."""
+    key = {
+        "format": HARNESS_CACHE_FORMAT,
+        "wireviz": __version__,
+        "yaml_input": text_hash(yaml_input),
+        "options": options or {},
+        "image_paths": [str(Path(p).resolve()) for p in image_paths],
+        "output_name": output_name,  # default title
+    }
+    return text_hash(json.dumps(key, sort_keys=True, default=str))
+
+
+def load_cached_harness(cache_dir: Union[str, Path], key: str):
+    """Return the cached harness for the key, or None if missing or outdated."""
+    try:
+        with open(Path(cache_dir) / f"{key}.pickle", "rb") as file:
+            entry = pickle.load(file)
+    except FileNotFoundError:
+        return None
+    except Exception as e:  # truncated or incompatible cache file
+        print(f"Harness cache warning: ignoring unreadable entry {key} ({e})")
+        return None
+    # The image sizes might have been read from the image files
+    for filename, digest in entry["images"].items():
+        if file_hash(filename) != digest:
+            return None
+    return entry["harness"]
+
+
+def save_cached_harness(cache_dir: Union[str, Path], key: str, harness) -> None:
+    """Store the harness in the cache, together with the hashes of its image files."""
+    entry = {
+        "images": {str(f): file_hash(f) for f in harness_image_files(harness)},
+        "harness": harness,
+    }
+    path = Path(cache_dir) / f"{key}.pickle"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Concurrent runs might store the same key, so write atomically
+    with open_file_replace(path, if_changed=False) as file:
+        pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
 
+import csv
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext, redirect_stdout
+from io import TextIOWrapper
 from pathlib import Path
+from tempfile import TemporaryDirectory
 
 import click
 
@@ -11,18 +16,44 @@ if __name__ == "__main__":
 
 import wireviz.wireviz as wv
 from wireviz import APP_NAME, __version__
-from wireviz.wv_helper import file_read_text
+from wireviz.svgembed import svg_embed_stats
+from wireviz.wv_bom import bom_list, merge_bom, project_bom_list
+from wireviz.wv_helper import (
+    file_read_text,
+    file_write_stats,
+    file_write_text,
+    open_file_replace,
+    tuplelist2tsv,
+)
+from wireviz.wv_html import (
+    html_pages,
+    html_template_file,
+    load_html_template,
+    write_html_document,
+)
+from wireviz.wv_manifest import (
+    MANIFEST_SUFFIX,
+    manifest_is_current,
+    write_depfile,
+    write_manifest,
+)
+from wireviz.wv_render import write_pdf_document
 
 format_codes = {
     # "c": "csv",
     "g": "gv",
     "h": "html",
+    "n": "net",
+    "N": "netjson",
     "p": "png",
-    # "P": "pdf",
+    "P": "pdf",
     "s": "svg",
     "t": "tsv",
 }
 
+# Output formats that can be written to stdout (a single document each)
+STDOUT_FORMATS = ("gv", "net", "netjson", "png", "svg", "tsv")
+
 epilog = "The -f or --format option accepts a string containing one or more of the "
 epilog += "following characters to specify which file types to output:\n"
 epilog += ", ".join([f"{key} ({value.upper()})" for key, value in format_codes.items()])
@@ -50,12 +81,20 @@ epilog += ", ".join([f"{key} ({value.upper()})" for key, value in format_codes.i
     type=Path,
     help="YAML file to prepend to the input file (optional).",
 )
+@click.option(
+    "-I",
+    "--image-path",
+    default=[],
+    multiple=True,
+    type=Path,
+    help="Additional directory to search for images (optional).",
+)
 @click.option(
     "-o",
     "--output-dir",
     default=None,
     type=Path,
-    help="Directory to use for output files, if different from input file directory.",
+    help="Directory to use for output files, if different from input file directory, or - to write to stdout.",
 )
 @click.option(
     "-O",
@@ -64,6 +103,38 @@ epilog += ", ".join([f"{key} ({value.upper()})" for key, value in format_codes.i
     type=str,
     help="File name (without extension) to use for output files, if different from input file name.",
 )
+@click.option(
+    "-i",
+    "--incremental",
+    is_flag=True,
+    default=False,
+    help=f"Skip input files whose outputs are up to date (tracked in *{MANIFEST_SUFFIX} files).",
+)
+@click.option(
+    "-d",
+    "--depfile",
+    is_flag=True,
+    default=False,
+    help="Write a Makefile-style dependency file (*.d) for each input file.",
+)
+@click.option(
+    "--draft",
+    is_flag=True,
+    default=False,
+    help="Render faster at lower quality, for previews while editing.",
+)
+@click.option(
+    "--reuse-layout",
+    is_flag=True,
+    default=False,
+    help="Keep node positions from the previous run where possible.",
+)
+@click.option(
+    "--cache-dir",
+    default=None,
+    type=Path,
+    help="Directory to cache parsed harnesses in, to skip parsing unchanged input files.",
+)
 @click.option(
     "-V",
     "--version",
@@ -71,80 +142,418 @@ epilog += ", ".join([f"{key} ({value.upper()})" for key, value in format_codes.i
     default=False,
     help=f"Output {APP_NAME} version and exit.",
 )
-def wireviz(file, format, prepend, output_dir, output_name, version):
+def wireviz(
+    file,
+    format,
+    prepend,
+    image_path,
+    output_dir,
+    output_name,
+    incremental,
+    depfile,
+    draft,
+    reuse_layout,
+    cache_dir,
+    version,
+):
     """
     Parses the provided FILE and generates the specified outputs.
+    Use - as FILE to read the YAML input from stdin.
     """
-    print()
-    print(f"{APP_NAME} {__version__}")
-    if version:
-        return  # print version number only and exit
-
-    # get list of files
-    try:
-        _ = iter(file)
-    except TypeError:
-        filepaths = [file]
-    else:
-        filepaths = list(file)
+    to_stdout = output_dir is not None and str(output_dir) == "-"
+    output_stream = sys.stdout.buffer if to_stdout else None
+    # Keep stdout free for the output data, and print all messages to stderr
+    with redirect_stdout(sys.stderr) if to_stdout else nullcontext():
+        print()
+        print(f"{APP_NAME} {__version__}")
+        if version:
+            return  # print version number only and exit
+        if to_stdout and (incremental or depfile):
+            raise Exception("--incremental and --depfile require output files")
+        if to_stdout and format == "hpst":  # default formats
+            format = "s"
+        if "-" in file and not output_name and not to_stdout:
+            raise Exception("Reading from stdin requires --output-name")
+        if list(file).count("-") > 1:
+            raise Exception("stdin can only be read once")
 
-    # determine output formats
-    output_formats = []
-    for code in format:
-        if code in format_codes:
-            output_formats.append(format_codes[code])
+        # get list of files
+        try:
+            _ = iter(file)
+        except TypeError:
+            filepaths = [file]
         else:
-            raise Exception(f"Unknown output format: {code}")
-    output_formats = tuple(sorted(set(output_formats)))
-    output_formats_str = (
-        f'[{"|".join(output_formats)}]'
-        if len(output_formats) > 1
-        else output_formats[0]
+            filepaths = list(file)
+
+        # determine output formats
+        output_formats = []
+        for code in format:
+            if code in format_codes:
+                output_formats.append(format_codes[code])
+            else:
+                raise Exception(f"Unknown output format: {code}")
+        output_formats = tuple(sorted(set(output_formats)))
+        if to_stdout:
+            if len(output_formats) > 1:
+                raise click.UsageError(
+                    "Only one output format can be written to stdout"
+                )
+            if output_formats[0] not in STDOUT_FORMATS:
+                raise click.UsageError(
+                    f"{output_formats[0].upper()} output cannot be written to stdout"
+                    f" (supported: {', '.join(f.upper() for f in STDOUT_FORMATS)})"
+                )
+        output_formats_str = (
+            f'[{"|".join(output_formats)}]'
+            if len(output_formats) > 1
+            else output_formats[0]
+        )
+
+        # check prepend file
+        prepend_input = read_prepend_files(prepend)
+
+        options = {}
+        if draft:
+            options["render_profile"] = "draft"
+        if reuse_layout:
+            options["reuse_layout"] = True
+
+        # run WireVIz on each input file
+        for file in filepaths:
+            from_stdin = file == "-"
+            file = Path(file)
+            if not from_stdin and not file.exists():
+                raise Exception(f"File does not exist:\n{file}")
+
+            # file_out = file.with_suffix("") if not output_file else output_file
+            _output_dir = file.parent if not output_dir else output_dir
+            _output_name = file.stem if not output_name else output_name
+
+            print("Input file:  ", "stdin" if from_stdin else file)
+            if to_stdout:
+                print("Output:       stdout")
+            else:
+                print(
+                    "Output file: ",
+                    f"{Path(_output_dir / _output_name)}.{output_formats_str}",
+                )
+
+            if from_stdin:
+                stdin = TextIOWrapper(sys.stdin.buffer, encoding="utf-8")
+                yaml_input = stdin.read()
+                stdin.detach()  # leave sys.stdin open
+                image_paths = {Path.cwd()}  # instead of the input file directory
+            else:
+                yaml_input = file_read_text(file)
+                image_paths = {file.parent}
+
+            yaml_input = prepend_input + yaml_input
+            for p in prepend:
+                image_paths.add(Path(p).parent)
+            image_paths.update(image_path)
+
+            output_file = Path(_output_dir) / _output_name
+            if incremental and manifest_is_current(
+                output_file,
+                yaml_input,
+                output_formats,
+                options,
+                image_paths=image_paths,
+            ):
+                print("Up to date, skipped.")
+                continue
+
+            if to_stdout:
+                harness = wv.parse(
+                    yaml_input,
+                    return_types="harness",
+                    output_name=_output_name,
+                    image_paths=list(image_paths),
+                    options=options,
+                    cache_dir=cache_dir,
+                )
+                harness.write(output_formats[0], output_stream)
+                output_stream.flush()
+                continue
+
+            harness = wv.parse(
+                yaml_input,
+                return_types="harness" if incremental or depfile else None,
+                output_formats=output_formats,
+                output_dir=_output_dir,
+                output_name=_output_name,
+                image_paths=list(image_paths),
+                options=options,
+                cache_dir=cache_dir,
+            )
+            if incremental:
+                write_manifest(
+                    output_file,
+                    yaml_input,
+                    output_formats,
+                    harness,
+                    options,
+                    image_paths=image_paths,
+                )
+            if depfile:
+                source_files = [*([] if from_stdin else [file]), *map(Path, prepend)]
+                write_depfile(output_file, output_formats, harness, source_files)
+
+        print()
+        if not to_stdout:
+            print(
+                f"Output files: {file_write_stats['written']} written, "
+                f"{file_write_stats['unchanged']} unchanged"
+            )
+        if svg_embed_stats["bytes_saved"] > 0:
+            print(
+                f"Repeated images embedded once, saving {svg_embed_stats['bytes_saved']} bytes"
+            )
+        print()
+
+
+def read_prepend_files(prepend) -> str:
+    """Return the concatenated contents of the prepend files."""
+    prepend_input = ""
+    for prepend_file in prepend:
+        prepend_file = Path(prepend_file)
+        if not prepend_file.exists():
+            raise Exception(f"File does not exist:\n{prepend_file}")
+        print("Prepend file:", prepend_file)
+
+        prepend_input += file_read_text(prepend_file) + "\n"
+    return prepend_input
+
+
+def harness_bom(file: Path, prepend_input: str, image_paths: list) -> list:
+    """Parse one harness file and return its BOM (runs in a worker process)."""
+    harness = wv.parse(
+        prepend_input + file_read_text(file),
+        return_types="harness",
+        image_paths=[file.parent, *image_paths],
     )
+    return harness.bom()
 
-    # check prepend file
-    if len(prepend) > 0:
-        prepend_input = ""
-        for prepend_file in prepend:
-            prepend_file = Path(prepend_file)
-            if not prepend_file.exists():
-                raise Exception(f"File does not exist:\n{prepend_file}")
-            print("Prepend file:", prepend_file)
 
-            prepend_input += file_read_text(prepend_file) + "\n"
+@click.command(
+    no_args_is_help=True,
+    context_settings=dict(help_option_names=["-h", "--help"]),
+)
+@click.argument("file", nargs=-1)
+@click.option(
+    "-p",
+    "--prepend",
+    default=[],
+    multiple=True,
+    type=Path,
+    help="YAML file to prepend to each input file (optional).",
+)
+@click.option(
+    "-o",
+    "--output",
+    required=True,
+    type=Path,
+    help="Output file for the project BOM (.csv for comma-separated, otherwise tab-separated).",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    default=None,
+    type=int,
+    help="Number of input files to process in parallel (default: number of CPUs).",
+)
+def wireviz_bom(file, prepend, output, jobs):
+    """
+    Generates one consolidated BOM for all provided harness FILEs.
+    """
+    print()
+    print(f"{APP_NAME} {__version__}")
+
+    filepaths = [Path(f) for f in file]
+    for f in filepaths:
+        if not f.exists():
+            raise Exception(f"File does not exist:\n{f}")
+    prepend_input = read_prepend_files(prepend)
+    image_paths = list({Path(p).parent for p in prepend})
+
+    # Each harness BOM is merged as soon as it is available, so only the
+    # project BOM (one entry per unique part) is kept in memory.
+    project_bom = {}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        boms = executor.map(
+            harness_bom,
+            filepaths,
+            [prepend_input] * len(filepaths),
+            [image_paths] * len(filepaths),
+        )
+        for f, bom in zip(filepaths, boms):
+            print("Input file:  ", f)
+            merge_bom(project_bom, f.stem, bom)
+
+    print("Output file: ", output)
+    rows = project_bom_list(project_bom)
+    if output.suffix.lower() == ".csv":
+        with open_file_replace(output, "w", encoding="utf-8", newline="") as csvfile:
+            csv.writer(csvfile).writerows(rows)
     else:
-        prepend_input = ""
+        file_write_text(output, tuplelist2tsv(rows))
+
+    print()
 
-    # run WireVIz on each input file
-    for file in filepaths:
-        file = Path(file)
-        if not file.exists():
-            raise Exception(f"File does not exist:\n{file}")
 
-        # file_out = file.with_suffix("") if not output_file else output_file
-        _output_dir = file.parent if not output_dir else output_dir
-        _output_name = file.stem if not output_name else output_name
+def harness_document(
+    file: Path,
+    prepend_input: str,
+    image_paths: list,
+    output_name: Path,
+    output_formats: tuple,
+) -> dict:
+    """Parse and render one harness of a combined document (runs in a worker process).
 
-        print("Input file:  ", file)
-        print(
-            "Output file: ", f"{Path(_output_dir / _output_name)}.{output_formats_str}"
-        )
+    The diagram files are written to disk, and only what is needed to
+    generate the HTML pages is returned."""
+    harness = wv.parse(
+        prepend_input + file_read_text(file),
+        return_types="harness",
+        output_name=file.stem,  # default title
+        image_paths=[file.parent, *image_paths],
+    )
+    formats = []
+    if "html" in output_formats:
+        formats.append("svg")
+        template = load_html_template(html_template_file(file, harness.metadata))
+        if "<!-- %diagram_png_b64% -->" in template:
+            formats.append("png")
+    if "pdf" in output_formats:
+        formats.append("pdf")
+    harness.output(output_name, fmt=tuple(formats))
+    return {
+        "title": str(harness.metadata["title"]),
+        "bom_list": bom_list(harness.bom()),
+        "metadata": harness.metadata,
+        "options": harness.options,
+        "sheet_names": harness.sheet_names(output_name),
+    }
+
+
+@click.command(
+    no_args_is_help=True,
+    context_settings=dict(help_option_names=["-h", "--help"]),
+)
+@click.argument("file", nargs=-1)
+@click.option(
+    "-p",
+    "--prepend",
+    default=[],
+    multiple=True,
+    type=Path,
+    help="YAML file to prepend to each input file (optional).",
+)
+@click.option(
+    "-o",
+    "--output",
+    required=True,
+    multiple=True,
+    type=Path,
+    help="Output file for the combined document (.html or .pdf), may be repeated.",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    default=None,
+    type=int,
+    help="Number of input files to process in parallel (default: number of CPUs).",
+)
+def wireviz_doc(file, prepend, output, jobs):
+    """
+    Generates one document with a table of contents and the diagrams and BOMs
+    of all provided harness FILEs, with continuous sheet numbering.
+    """
+    print()
+    print(f"{APP_NAME} {__version__}")
 
-        yaml_input = file_read_text(file)
-        file_dir = file.parent
+    output_formats = []
+    for output_file in output:
+        fmt = output_file.suffix.lower().lstrip(".")
+        if fmt not in ("html", "pdf"):
+            raise Exception(f"Unsupported combined document format: {output_file}")
+        output_formats.append(fmt)
+    output_formats = tuple(sorted(set(output_formats)))
+    if "pdf" in output_formats:
+        try:
+            import pypdf  # noqa: F401 (only checks availability)
+        except ImportError:
+            raise Exception("Combined PDF output requires the pypdf package")
 
-        yaml_input = prepend_input + yaml_input
-        image_paths = {file_dir}
-        for p in prepend:
-            image_paths.add(Path(p).parent)
+    filepaths = [Path(f) for f in file]
+    for f in filepaths:
+        if not f.exists():
+            raise Exception(f"File does not exist:\n{f}")
+    prepend_input = read_prepend_files(prepend)
+    image_paths = list({Path(p).parent for p in prepend})
 
-        wv.parse(
-            yaml_input,
-            output_formats=output_formats,
-            output_dir=_output_dir,
-            output_name=_output_name,
-            image_paths=list(image_paths),
+    # The harnesses are rendered in parallel into a temporary directory, and
+    # the document is assembled from there one sheet at a time, so only
+    # one diagram at a time is held in memory.
+    with TemporaryDirectory() as tempdir, ProcessPoolExecutor(
+        max_workers=jobs
+    ) as executor:
+        output_names = [
+            Path(tempdir) / f"{n}_{f.stem}" for n, f in enumerate(filepaths, 1)
+        ]
+        documents = list(
+            executor.map(
+                harness_document,
+                filepaths,
+                [prepend_input] * len(filepaths),
+                [image_paths] * len(filepaths),
+                output_names,
+                [output_formats] * len(filepaths),
+            )
         )
+        for f in filepaths:
+            print("Input file:  ", f)
+
+        first_sheets = []
+        sheet_total = 0
+        for document in documents:
+            first_sheets.append(sheet_total + 1)
+            sheet_total += len(document["sheet_names"])
+
+        for output_file in output:
+            print("Output file: ", output_file)
+            if output_file.suffix.lower() == ".pdf":
+                write_pdf_document(
+                    output_file,
+                    [
+                        (document["title"], f"{name}.pdf")
+                        for document, name in zip(documents, output_names)
+                    ],
+                )
+                continue
+            sections = [
+                (
+                    document["title"],
+                    first_sheet,
+                    html_pages(
+                        # same output name as when generating the HTML
+                        # output of this harness on its own
+                        file.parent.resolve() / file.stem,
+                        document["bom_list"],
+                        document["metadata"],
+                        document["options"],
+                        document["sheet_names"],
+                        sheet_offset=first_sheet - 1,
+                        sheet_total=sheet_total,
+                        svg_suffix=".svg",
+                        template_file=html_template_file(file, document["metadata"]),
+                    ),
+                )
+                for file, document, first_sheet in zip(
+                    filepaths, documents, first_sheets
+                )
+            ]
+            write_html_document(output_file, sections)
 
     print()
 
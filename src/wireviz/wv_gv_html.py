@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 
 import re
+from html import escape
+from pathlib import Path
 from typing import List, Optional, Union
 
 from wireviz.DataClasses import Color
@@ -64,11 +66,15 @@ def html_colorbar(color: Color) -> str:
     return html_bgcolor(color, ' width="4"') if color else None
 
 
-def html_image(image):
+def html_image(image, placeholder: bool = False):
     from wireviz.DataClasses import Image
 
     if not image:
         return None
+    if placeholder:
+        # Keep the width and height of the image cell if specified (otherwise
+        # the cell shrinks to the file name), but don't make Graphviz load the image
+        return f"""<tdX{' sides="TLR"' if image.caption else ''}{html_bgcolor_attr(image.bgcolor)}{html_size_attr(image)}>[{escape(Path(image.src).name)}]"""
     # The leading attributes belong to the preceeding tag. See where used below.
     html = f'{html_size_attr(image)}><img scale="{image.scale}" src="{image.src}"/>'
     if image.fixedsize:
@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 
+import filecmp
+import os
 import re
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, List
+from typing import IO, Dict, Iterator, List, Optional, Tuple, Union
 
 awg_equiv_table = {
     "0.09": "28",
@@ -133,9 +136,112 @@ def file_read_text(filename: str) -> str:
     return Path(filename).read_text(encoding="utf-8")
 
 
+# Number of files written, and of writes skipped because the contents were identical
+file_write_stats = {"written": 0, "unchanged": 0}
+
+
+def file_write_bytes(filename: str, data: bytes) -> bool:
+    """Write binary file unless it already has identical contents, and return True if written
+
+    The data is written to a temporary file that is renamed to the target,
+    so readers never see a partially written file."""
+    path = Path(filename)
+    try:
+        if path.stat().st_size == len(data) and path.read_bytes() == data:
+            file_write_stats["unchanged"] += 1
+            return False
+    except OSError:
+        pass  # file does not exist yet or cannot be read
+    with open_file_replace(path, if_changed=False) as file:
+        file.write(data)
+    file_write_stats["written"] += 1
+    return True
+
+
 def file_write_text(filename: str, text: str) -> int:
-    """Write utf-8 encoded text file, close it, and return the number of characters written"""
-    return Path(filename).write_text(text, encoding="utf-8")
+    """Write utf-8 encoded text file (if changed) and return the number of characters"""
+    # Same newline translation as in text mode
+    file_write_bytes(filename, text.replace("\n", os.linesep).encode("utf-8"))
+    return len(text)
+
+
+def file_replace(temp_filename: str, filename: str) -> bool:
+    """Rename temporary file to the target unless that has identical contents, and return True if replaced
+
+    The files are compared on disk, so the contents are never loaded as a whole.
+    An unchanged target keeps its timestamp, and the temporary file is deleted."""
+    temp_path, path = Path(temp_filename), Path(filename)
+    # Cached results are keyed by size and mtime, which might not have changed
+    filecmp.clear_cache()
+    try:
+        identical = filecmp.cmp(temp_path, path, shallow=False)
+    except OSError:
+        identical = False  # target does not exist yet or cannot be read
+    if identical:
+        temp_path.unlink()
+        file_write_stats["unchanged"] += 1
+        return False
+    temp_path.replace(path)
+    file_write_stats["written"] += 1
+    return True
+
+
+@contextmanager
+def open_file_replace(
+    filename: str, mode: str = "wb", if_changed: bool = True, **kwargs
+) -> Iterator[IO]:
+    """Open a temporary file that replaces the target when closed, unless it has identical contents
+
+    For output written in pieces instead of as a whole like file_write_bytes().
+    With if_changed=False, the target is always replaced and not counted in
+    file_write_stats. The temporary file is deleted if writing fails."""
+    path = Path(filename)
+    temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(temp_path, mode, **kwargs) as file:
+            yield file
+        if if_changed:
+            file_replace(temp_path, path)
+        else:
+            temp_path.replace(path)
+    except BaseException:
+        try:
+            temp_path.unlink()
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class DisjointSet:
+    """Union-find structure over hashable items, keeping insertion order."""
+
+    def __init__(self):
+        self.parent = {}
+
+    def add(self, item) -> None:
+        if item not in self.parent:
+            self.parent[item] = item
+
+    def find(self, item):
+        """Return the representative item of the set containing item."""
+        self.add(item)
+        parent = self.parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]  # path halving
+            item = parent[item]
+        return item
+
+    def union(self, a, b) -> None:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[root_b] = root_a
+
+    def groups(self) -> List[List]:
+        """Return all sets as lists, ordered by first insertion of their members."""
+        groups = {}
+        for item in self.parent:
+            groups.setdefault(self.find(item), []).append(item)
+        return list(groups.values())
 
 
 def is_arrow(inp):
@@ -167,6 +273,41 @@ def aspect_ratio(image_src):
     return 1  # Assume 1:1 when unable to read actual image size
 
 
+# Per-process caches of smart_file_resolve(), see smart_file_resolve_cache_clear()
+_resolved_dirs: Dict[Union[str, Tuple[str, str]], Path] = {}
+_resolved_files: Dict[Tuple[Path, Path], Optional[Path]] = {}
+# Number of filesystem calls (path resolutions and existence checks) that were
+# answered from the caches above instead of hitting the filesystem
+file_resolve_stats = {"lookups": 0, "syscalls_saved": 0}
+
+
+def smart_file_resolve_cache_clear() -> None:
+    """Forget all cached path resolutions, e.g. when files may have been moved."""
+    _resolved_dirs.clear()
+    _resolved_files.clear()
+
+
+def _resolve_dir(path) -> Path:
+    # Relative directories depend on the current working directory
+    key = str(path) if Path(path).is_absolute() else (os.getcwd(), str(path))
+    resolved = _resolved_dirs.get(key)
+    if resolved is None:
+        resolved = _resolved_dirs[key] = Path(path).resolve()
+    else:
+        file_resolve_stats["syscalls_saved"] += 1
+    return resolved
+
+
+def _resolve_file(directory: Path, filename: Path) -> Optional[Path]:
+    key = (directory, filename)
+    if key in _resolved_files:
+        file_resolve_stats["syscalls_saved"] += 2
+        return _resolved_files[key]
+    resolved_path = (directory / filename).resolve()
+    _resolved_files[key] = resolved_path if resolved_path.exists() else None
+    return _resolved_files[key]
+
+
 def smart_file_resolve(filename: str, possible_paths: (str, List[str])) -> Path:
     if not isinstance(possible_paths, List):
         possible_paths = [possible_paths]
@@ -177,12 +318,13 @@ def smart_file_resolve(filename: str, possible_paths: (str, List[str])) -> Path:
         else:
             raise Exception(f"{filename} does not exist.")
     else:  # search all possible paths in decreasing order of precedence
+        file_resolve_stats["lookups"] += 1
         possible_paths = [
-            Path(path).resolve() for path in possible_paths if path is not None
+            _resolve_dir(path) for path in possible_paths if path is not None
         ]
         for possible_path in possible_paths:
-            resolved_path = (possible_path / filename).resolve()
-            if resolved_path.exists():
+            resolved_path = _resolve_file(possible_path, filename)
+            if resolved_path is not None:
                 return resolved_path
         else:
             raise Exception(
@@ -2,7 +2,7 @@
 
 import re
 from pathlib import Path
-from typing import Callable, Dict, List, Union
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 from wireviz import APP_NAME, APP_URL, __version__, wv_colors
 from wireviz.DataClasses import Metadata, Options
@@ -12,65 +12,139 @@ from wireviz.wv_helper import (
     file_read_text,
     file_write_text,
     flatten2d,
+    open_file_replace,
     smart_file_resolve,
 )
 
+# Placeholders are HTML comments like <!-- %title% -->
+TEMPLATE_PLACEHOLDER = re.compile(r"(<!-- %[^%<>]*% -->)")
 
-def generate_html_output(
-    filename: Union[str, Path],
-    bom_list: List[List[str]],
-    metadata: Metadata,
-    options: Options,
-):
-    # load HTML template
+
+class HTMLTemplate:
+    """HTML template text, split into literal segments and the placeholders between them."""
+
+    def __init__(self, text: str):
+        segments = TEMPLATE_PLACEHOLDER.split(text)
+        self.literals = segments[0::2]
+        self.placeholders = segments[1::2]
+
+    def __contains__(self, placeholder: str) -> bool:
+        return placeholder in self.placeholders
+
+    def render(self, replacements: Dict[str, str]) -> str:
+        """Return the template text with placeholders replaced (unknown ones are kept)."""
+        output = [self.literals[0]]
+        for placeholder, literal in zip(self.placeholders, self.literals[1:]):
+            output.append(replacements.get(placeholder, placeholder))
+            output.append(literal)
+        return "".join(output)
+
+
+# Parsed templates by path, with the modification time they were parsed at
+_template_cache: Dict[Path, Tuple[int, HTMLTemplate]] = {}
+
+
+def load_html_template(templatefile: Union[str, Path]) -> HTMLTemplate:
+    """Return the parsed template, reusing the cached one if the file is unchanged."""
+    templatefile = Path(templatefile)
+    mtime = templatefile.stat().st_mtime_ns
+    cached = _template_cache.get(templatefile)
+    if cached is None or cached[0] != mtime:
+        # TODO?: Warn if unexpected meta charset?
+        cached = (mtime, HTMLTemplate(file_read_text(templatefile)))
+        _template_cache[templatefile] = cached
+    return cached[1]
+
+
+def html_template_file(filename: Union[str, Path], metadata: Metadata) -> Path:
+    """Return the path of the HTML template to use for the output filename."""
     templatename = metadata.get("template", {}).get("name")
     if templatename:
         # if relative path to template was provided, check directory of YAML file first, fall back to built-in template directory
-        templatefile = smart_file_resolve(
+        return smart_file_resolve(
             f"{templatename}.html",
             [Path(filename).parent, Path(__file__).parent / "templates"],
         )
     else:
         # fall back to built-in simple template if no template was provided
-        templatefile = Path(__file__).parent / "templates/simple.html"
+        return Path(__file__).parent / "templates/simple.html"
 
-    html = file_read_text(templatefile)  # TODO?: Warn if unexpected meta charset?
 
-    # embed SVG diagram (only if used)
-    def svgdata() -> str:
-        return re.sub(  # TODO?: Verify xml encoding="utf-8" in SVG?
-            "^<[?]xml [^?>]*[?]>[^<]*<!DOCTYPE [^>]*>",
-            "<!-- XML and DOCTYPE declarations from SVG file removed -->",
-            file_read_text(f"{filename}.tmp.svg"),
-            1,
-        )
+def generate_html_output(
+    filename: Union[str, Path],
+    bom_list: List[List[str]],
+    metadata: Metadata,
+    options: Options,
+    sheet_filenames: Optional[List[str]] = None,
+):
+    pages = html_pages(filename, bom_list, metadata, options, sheet_filenames)
+    file_write_text(f"{filename}.html", merge_html_pages(list(pages)))
+
+
+def html_pages(
+    filename: Union[str, Path],
+    bom_list: List[List[str]],
+    metadata: Metadata,
+    options: Options,
+    sheet_filenames: Optional[List[str]] = None,
+    sheet_offset: int = 0,
+    sheet_total: Optional[int] = None,
+    svg_suffix: str = ".tmp.svg",
+    template_file: Union[None, str, Path] = None,
+) -> Iterator[str]:
+    """Generate one HTML page per sheet, each when requested.
+
+    The sheets are numbered from sheet_offset + 1, out of sheet_total sheets
+    (by default the sheets of this harness only). The template is looked up
+    next to filename, unless template_file is given."""
+    # each sheet has its own diagram files; the BOM is included on the first sheet only
+    if not sheet_filenames:
+        sheet_filenames = [str(filename)]
+    if sheet_total is None:
+        sheet_total = len(sheet_filenames)
+
+    # load HTML template
+    if template_file is None:
+        template_file = html_template_file(filename, metadata)
+    template = load_html_template(template_file)
 
     # generate BOM table
     bom = flatten2d(bom_list)
+    col_classes = [f"bom_col_{item.lower()}" for item in bom[0]]
 
     # generate BOM header (may be at the top or bottom of the table)
-    bom_header_html = "  <tr>\n"
-    for item in bom[0]:
-        th_class = f"bom_col_{item.lower()}"
-        bom_header_html = f'{bom_header_html}    <th class="{th_class}">{item}</th>\n'
-    bom_header_html = f"{bom_header_html}  </tr>\n"
+    bom_header_html = "".join(
+        [
+            "  <tr>\n",
+            *(
+                f'    <th class="{th_class}">{item}</th>\n'
+                for th_class, item in zip(col_classes, bom[0])
+            ),
+            "  </tr>\n",
+        ]
+    )
 
     # generate BOM contents
-    bom_contents = []
-    for row in bom[1:]:
-        row_html = "  <tr>\n"
-        for i, item in enumerate(row):
-            td_class = f"bom_col_{bom[0][i].lower()}"
-            row_html = f'{row_html}    <td class="{td_class}">{item}</td>\n'
-        row_html = f"{row_html}  </tr>\n"
-        bom_contents.append(row_html)
+    bom_contents = [
+        "".join(
+            [
+                "  <tr>\n",
+                *(
+                    f'    <td class="{td_class}">{item}</td>\n'
+                    for td_class, item in zip(col_classes, row)
+                ),
+                "  </tr>\n",
+            ]
+        )
+        for row in bom[1:]
+    ]
 
     bom_html = (
         '<table class="bom">\n' + bom_header_html + "".join(bom_contents) + "</table>\n"
     )
     bom_html_reversed = (
         '<table class="bom">\n'
-        + "".join(list(reversed(bom_contents)))
+        + "".join(reversed(bom_contents))
         + bom_header_html
         + "</table>\n"
     )
@@ -84,23 +158,12 @@ def generate_html_output(
         "<!-- %filename_stem% -->": Path(filename).stem,
         "<!-- %bom% -->": bom_html,
         "<!-- %bom_reversed% -->": bom_html_reversed,
-        "<!-- %sheet_current% -->": "1",  # TODO: handle multi-page documents
-        "<!-- %sheet_total% -->": "1",  # TODO: handle multi-page documents
+        "<!-- %sheet_total% -->": str(sheet_total),
         "<!-- %template_sheetsize% -->": metadata.get("template", {}).get(
             "sheetsize", ""
         ),
     }
 
-    def replacement_if_used(key: str, func: Callable[[], str]) -> None:
-        """Append replacement only if used in html."""
-        if key in html:
-            replacements[key] = func()
-
-    replacement_if_used("<!-- %diagram% -->", svgdata)
-    replacement_if_used(
-        "<!-- %diagram_png_b64% -->", lambda: data_URI_base64(f"{filename}.png")
-    )
-
     # prepare metadata replacements
     if metadata:
         for item, contents in metadata.items():
@@ -117,14 +180,95 @@ def generate_html_output(
                     elif isinstance(entry, (str, int, float)):
                         pass  # TODO?: replacements[f"<!-- %{item}_{category}% -->"] = html_line_breaks(str(entry))
 
-    # perform replacements
-    # regex replacement adapted from:
-    # https://gist.github.com/bgusach/a967e0587d6e01e889fd1d776c5f3729
+    for sheet, sheet_filename in enumerate(sheet_filenames, 1):
+        sheet_replacements = {
+            **replacements,
+            "<!-- %sheet_current% -->": str(sheet_offset + sheet),
+        }
+        if sheet > 1:
+            sheet_replacements["<!-- %bom% -->"] = ""
+            sheet_replacements["<!-- %bom_reversed% -->"] = ""
+
+        # embed SVG diagram (only if used)
+        def svgdata() -> str:
+            # Composed (partitioned) SVGs have an XML declaration but no DOCTYPE
+            return re.sub(  # TODO?: Verify xml encoding="utf-8" in SVG?
+                "^<[?]xml [^?>]*[?]>(?:[^<]*<!DOCTYPE [^>]*>)?",
+                "<!-- XML and DOCTYPE declarations from SVG file removed -->",
+                file_read_text(f"{sheet_filename}{svg_suffix}"),
+                1,
+            )
 
-    # longer replacements first, just in case
-    replacements_sorted = sorted(replacements, key=len, reverse=True)
-    replacements_escaped = map(re.escape, replacements_sorted)
-    pattern = re.compile("|".join(replacements_escaped))
-    html = pattern.sub(lambda match: replacements[match.group(0)], html)
+        def replacement_if_used(key: str, func: Callable[[], str]) -> None:
+            """Append replacement only if used in the template."""
+            if key in template:
+                sheet_replacements[key] = func()
 
-    file_write_text(f"{filename}.html", html)
+        replacement_if_used("<!-- %diagram% -->", svgdata)
+        replacement_if_used(
+            "<!-- %diagram_png_b64% -->",
+            lambda: data_URI_base64(f"{sheet_filename}.png"),
+        )
+
+        # perform replacements
+        yield template.render(sheet_replacements)
+
+
+HTML_BODY_START = re.compile(r"<body[^>]*>", re.IGNORECASE)
+HTML_BODY_END = re.compile(r"</body>", re.IGNORECASE)
+HTML_PAGE_BREAK = '\n<div style="break-before: page"></div>\n'
+
+
+def split_html_page(page: str) -> Tuple[str, str, str]:
+    """Return the HTML page split into the text up to and including <body>, the body contents, and the rest."""
+    start = HTML_BODY_START.search(page)
+    end = HTML_BODY_END.search(page)
+    if not (start and end):
+        raise Exception("HTML template must contain <body> and </body> tags")
+    return page[: start.end()], page[start.end() : end.start()], page[end.start() :]
+
+
+def merge_html_pages(pages: List[str]) -> str:
+    """Return the first HTML page with the body contents of all pages, each starting on a new printed page."""
+    if len(pages) == 1:
+        return pages[0]
+    parts = [split_html_page(page) for page in pages]
+    head, _, tail = parts[0]
+    return head + HTML_PAGE_BREAK.join(body for _, body, _ in parts) + tail
+
+
+def write_html_document(
+    filename: Union[str, Path], sections: List[Tuple[str, int, Iterable[str]]]
+) -> None:
+    """Write one HTML document with a table of contents, followed by the pages of all sections.
+
+    Each section is a (title, first sheet number, pages) tuple. The pages
+    are consumed one at a time and written immediately, so only one page
+    is held in memory at once. The head of the document is taken from the
+    first page. An existing document is only replaced if it changed."""
+    toc = [
+        '<nav class="toc">',
+        "<h1>Contents</h1>",
+        "<ol>",
+        *(
+            f'<li><a href="#section{index}">{html_line_breaks(title)}</a>'
+            f" (sheet {sheet})</li>"
+            for index, (title, sheet, _) in enumerate(sections, 1)
+        ),
+        "</ol>",
+        "</nav>",
+    ]
+    tail = "</body></html>\n"
+    with open_file_replace(filename, "w", encoding="UTF-8") as file:
+        for index, (_, _, pages) in enumerate(sections, 1):
+            for number, page in enumerate(pages):
+                head, body, rest = split_html_page(page)
+                if index == 1 and number == 0:
+                    file.write(head)
+                    file.write("\n".join(toc))
+                    tail = rest
+                file.write(HTML_PAGE_BREAK)
+                if number == 0:
+                    file.write(f'<a id="section{index}"></a>')
+                file.write(body)
+        file.write(tail)
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import graphviz
+from wireviz import __version__
+from wireviz.wv_helper import file_read_text, file_write_text
+from wireviz.wv_html import html_template_file
+
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_hash(filename: Union[str, Path]) -> Optional[str]:
+    """Return the SHA-256 of the file contents, or None if it cannot be read."""
+    try:
+        return hashlib.sha256(Path(filename).read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+@lru_cache(maxsize=None)
+def tool_versions() -> Dict[str, str]:
+    """Return the versions of the tools that affect the generated output."""
+    try:
+        graphviz_version = ".".join(str(v) for v in graphviz.version())
+    except Exception:  # Graphviz not installed or not working
+        graphviz_version = None
+    return {
+        "wireviz": __version__,
+        "graphviz": graphviz_version,
+        "graphviz_python": graphviz.__version__,
+    }
+
+
+def search_paths(paths: Iterable[Union[str, Path]]) -> List[str]:
+    """Return the resolved search paths, sorted to be independent of their order."""
+    return sorted({str(Path(p).resolve()) for p in paths})
+
+
+def harness_image_files(harness) -> List[Path]:
+    """Return the image files of all components of the harness."""
+    files = set()
+    for component in [*harness.connectors.values(), *harness.cables.values()]:
+        if component.image:
+            files.add(Path(component.image.src).resolve())
+    return sorted(files)
+
+
+def harness_input_files(
+    harness, output_file: Union[str, Path], output_formats: Tuple[str]
+) -> List[Path]:
+    """Return the image and template files the output of the harness depends on."""
+    files = set(harness_image_files(harness))
+    if "html" in output_formats:
+        files.add(Path(html_template_file(output_file, harness.metadata)).resolve())
+    return sorted(files)
+
+
+def harness_output_files(
+    harness, output_file: Union[str, Path], output_formats: Tuple[str]
+) -> List[str]:
+    """Return the names of the files written by Harness.output()."""
+    name = Path(output_file).name
+    sheets = len(harness.sheet_groups())
+    if sheets > 1:
+        sheet_names = [f"{name}.sheet{n}" for n in range(1, sheets + 1)]
+    else:
+        sheet_names = [name]
+    outputs = []
+    for f in output_formats:
+        if f in ("png", "svg"):
+            outputs.extend(f"{sheet_name}.{f}" for sheet_name in sheet_names)
+        elif f in ("gv", "html", "pdf"):
+            outputs.append(f"{name}.{f}")
+        elif f == "tsv":
+            outputs.append(f"{name}.bom.tsv")
+        elif f == "net":
+            outputs.append(f"{name}.net.tsv")
+        elif f == "netjson":
+            outputs.append(f"{name}.net.json")
+    # node positions for the next render, saved along with any diagram output
+    graphical = {"html", "pdf", "png", "svg"}
+    if harness.options.reuse_layout and graphical.intersection(output_formats):
+        outputs.append(f"{name}.layout.json")
+    return sorted(outputs)
+
+
+def write_manifest(
+    output_file: Union[str, Path],
+    yaml_input: str,
+    output_formats: Tuple[str],
+    harness,
+    options: Optional[Dict] = None,
+    image_paths: Iterable[Union[str, Path]] = (),
+) -> None:
+    """Record the inputs and outputs of a harness, for manifest_is_current()."""
+    input_files = harness_input_files(harness, output_file, output_formats)
+    data = {
+        "versions": tool_versions(),
+        "formats": sorted(output_formats),
+        "options": options or {},
+        "image_paths": search_paths(image_paths),
+        "yaml": text_hash(yaml_input),
+        "inputs": {str(file): file_hash(file) for file in input_files},
+        "outputs": harness_output_files(harness, output_file, output_formats),
+    }
+    file_write_text(
+        f"{output_file}{MANIFEST_SUFFIX}", json.dumps(data, indent=2) + "\n"
+    )
+
+
+def manifest_is_current(
+    output_file: Union[str, Path],
+    yaml_input: str,
+    output_formats: Tuple[str],
+    options: Optional[Dict] = None,
+    image_paths: Iterable[Union[str, Path]] = (),
+) -> bool:
+    """Return True if the outputs exist and none of their recorded inputs has changed.
+
+    The YAML input (including prepended files) and the image search paths
+    determine which images and template are used, so these are taken from
+    the manifest without parsing."""
+    try:
+        manifest = json.loads(file_read_text(f"{output_file}{MANIFEST_SUFFIX}"))
+    except (OSError, ValueError):
+        return False
+    return (
+        manifest.get("versions") == tool_versions()
+        and manifest.get("formats") == sorted(output_formats)
+        and manifest.get("options") == (options or {})
+        and manifest.get("image_paths") == search_paths(image_paths)
+        and manifest.get("yaml") == text_hash(yaml_input)
+        and all(
+            file_hash(file) == digest
+            for file, digest in manifest.get("inputs", {}).items()
+        )
+        and all(
+            (Path(output_file).parent / name).exists()
+            for name in manifest.get("outputs", [])
+        )
+    )
+
+
+def make_escape(filename: Union[str, Path]) -> str:
+    """Return the file name escaped for use in a Makefile rule."""
+    return str(filename).replace("\\", "/").replace(" ", "\\ ").replace("$", "$$")
+
+
+def write_depfile(
+    output_file: Union[str, Path],
+    output_formats: Tuple[str],
+    harness,
+    source_files: List[Path],
+) -> None:
+    """Write a Makefile-style <output_file>.d listing all files the outputs depend on.
+
+    source_files are the YAML input file and any prepended files."""
+    output_dir = Path(output_file).parent
+    targets = [
+        output_dir / name
+        for name in harness_output_files(harness, output_file, output_formats)
+    ]
+    prerequisites = [
+        *source_files,
+        *harness_input_files(harness, output_file, output_formats),
+    ]
+    file_write_text(
+        f"{output_file}.d",
+        " ".join(make_escape(target) for target in targets)
+        + ": "
+        + " \\\n  ".join(make_escape(file) for file in prerequisites)
+        + "\n",
+    )
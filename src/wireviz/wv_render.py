@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+
+import re
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import BinaryIO, Dict, List, Optional, Sequence, Tuple, Union
+
+from graphviz import ExecutableNotFound, Graph
+from wireviz.wv_helper import open_file_replace
+
+# Vertical space (in points) between stacked partial diagrams
+PARTITION_GAP = 18
+
+
+class RenderBackend:
+    """Renders a graph into one or more output formats."""
+
+    # Whether render() may be called from several threads at once
+    thread_safe = True
+
+    def render(self, graph: Graph, formats: Sequence[str]) -> Dict[str, bytes]:
+        raise NotImplementedError
+
+    def write(self, graph: Graph, fmt: str, out: BinaryIO) -> None:
+        """Write the graph rendered in the given format to a binary stream."""
+        out.write(self.render(graph, [fmt])[fmt])
+
+
+class GraphvizBackend(RenderBackend):
+    """Render by running the Graphviz executables, using the graphviz package."""
+
+    def render(self, graph: Graph, formats: Sequence[str]) -> Dict[str, bytes]:
+        if len(formats) == 1:
+            return {formats[0]: graph.pipe(format=formats[0])}
+        # Lay out once and write all formats from a single Graphviz process
+        with TemporaryDirectory() as tempdir:
+            files = {fmt: Path(tempdir) / f"output.{fmt}" for fmt in formats}
+            cmd = [graph.engine]
+            for fmt, file in files.items():
+                cmd += [f"-T{fmt}", f"-o{file}"]
+            try:
+                proc = subprocess.run(
+                    cmd,
+                    input=graph.source.encode(graph.encoding),
+                    capture_output=True,
+                )
+            except FileNotFoundError as error:
+                raise ExecutableNotFound(cmd) from error
+            if proc.returncode != 0:
+                raise Exception(
+                    f"{graph.engine} failed with exit status {proc.returncode}:\n"
+                    + proc.stderr.decode(errors="replace")
+                )
+            return {fmt: file.read_bytes() for fmt, file in files.items()}
+
+    def write(self, graph: Graph, fmt: str, out: BinaryIO) -> None:
+        try:
+            out.flush()
+            fileno = out.fileno()
+        except (AttributeError, OSError, ValueError):
+            return super().write(graph, fmt, out)  # not backed by a file
+        # Let Graphviz write directly into the file, without copying the data
+        cmd = [graph.engine, f"-T{fmt}"]
+        try:
+            proc = subprocess.run(
+                cmd,
+                input=graph.source.encode(graph.encoding),
+                stdout=fileno,
+                stderr=subprocess.PIPE,
+            )
+        except FileNotFoundError as error:
+            raise ExecutableNotFound(cmd) from error
+        if proc.returncode != 0:
+            raise Exception(
+                f"{graph.engine} failed with exit status {proc.returncode}:\n"
+                + proc.stderr.decode(errors="replace")
+            )
+
+
+class PygraphvizBackend(RenderBackend):
+    """Render in-process with the Graphviz libraries, using the optional pygraphviz package."""
+
+    # The Graphviz libraries keep global state, so only one render at a time
+    thread_safe = False
+    lock = threading.Lock()
+
+    def __init__(self):
+        import pygraphviz
+
+        self.pygraphviz = pygraphviz
+
+    def render(self, graph: Graph, formats: Sequence[str]) -> Dict[str, bytes]:
+        with self.lock:
+            agraph = self.pygraphviz.AGraph(string=graph.source)
+            agraph.layout(prog=graph.engine)
+            # draw() without prog reuses the layout computed above
+            return {fmt: agraph.draw(format=fmt) for fmt in formats}
+
+
+RENDER_BACKENDS = {
+    "graphviz": GraphvizBackend,
+    "pygraphviz": PygraphvizBackend,
+}
+
+_render_backends: Dict[str, RenderBackend] = {}
+
+
+def get_render_backend(name: Optional[str] = None) -> RenderBackend:
+    """Return the named render backend, or by default the graphviz one.
+
+    If the pygraphviz package is missing, the graphviz backend is used instead."""
+    name = name or "graphviz"
+    if name not in RENDER_BACKENDS:
+        raise Exception(
+            f"Unknown render backend: {name} (supported: {', '.join(RENDER_BACKENDS)})"
+        )
+    if name not in _render_backends:
+        try:
+            _render_backends[name] = RENDER_BACKENDS[name]()
+        except ImportError as error:
+            print(f"Render backend warning: {error}, using graphviz instead")
+            # Remember the fallback, to not retry the import for every render
+            _render_backends[name] = get_render_backend("graphviz")
+    return _render_backends[name]
+
+
+def parse_plain_positions(plain: str) -> Dict[str, Tuple[float, float]]:
+    """Return the node center positions (in inches) from Graphviz plain output."""
+    node = re.compile(r'^node ("(?:[^"\\]|\\.)*"|\S+) (\S+) (\S+) ', re.M)
+    positions = {}
+    for match in node.finditer(plain):
+        name = match[1]
+        if name.startswith('"'):
+            name = re.sub(r"\\(.)", r"\1", name[1:-1])
+        positions[name] = (float(match[2]), float(match[3]))
+    return positions
+
+
+def render_parallel(
+    graphs: List[Graph], formats: Sequence[str], backend: RenderBackend
+) -> List[Dict[str, bytes]]:
+    """Return each graph rendered in the given formats, rendering concurrently if possible."""
+    if len(graphs) == 1 or not backend.thread_safe:
+        return [backend.render(graph, formats) for graph in graphs]
+    # Each render spawns its own Graphviz process, so threads are sufficient.
+    with ThreadPoolExecutor() as executor:
+        return list(executor.map(lambda graph: backend.render(graph, formats), graphs))
+
+
+def compose_svg(svgs: List[str], bgcolor: str) -> str:
+    """Return one SVG document with the input SVG diagrams stacked vertically."""
+    svg_tag = re.compile(r"<svg\b[^>]*>", re.S)
+    parts = []
+    width = 0
+    height = 0
+    for svg in svgs:
+        match = svg_tag.search(svg)
+        if not match:
+            raise Exception("compose_svg(): No <svg> element found")
+        tag = match[0]
+        w, h = (
+            float(re.search(rf'\b{dim}="([0-9.]+)(pt)?"', tag)[1])
+            for dim in ("width", "height")
+        )
+        # Use unit-less dimensions that match the points of the outer viewBox
+        tag = re.sub(r'\bwidth="[^"]*"', f'width="{w:g}"', tag, 1)
+        tag = re.sub(r'\bheight="[^"]*"', f'height="{h:g}"', tag, 1)
+        tag = tag.replace("<svg", f'<svg x="0" y="{height:g}"', 1)
+        parts.append(tag + svg[match.end() :])  # Drop XML declaration and DOCTYPE
+        width = max(width, w)
+        height += h + PARTITION_GAP
+    height -= PARTITION_GAP
+    return "\n".join(
+        [
+            '<?xml version="1.0" encoding="UTF-8" standalone="no"?>',
+            f'<svg width="{width:g}pt" height="{height:g}pt" viewBox="0 0 {width:g} {height:g}"'
+            ' xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink">',
+            f'<rect width="100%" height="100%" fill="{bgcolor}"/>',
+            *parts,
+            "</svg>",
+            "",
+        ]
+    )
+
+
+def compose_pdf(pdfs: List[bytes]) -> bytes:
+    """Return one PDF document with the pages of all input PDF documents.
+
+    Requires the optional pypdf package."""
+    from pypdf import PdfReader, PdfWriter
+
+    writer = PdfWriter()
+    for pdf in pdfs:
+        writer.append(PdfReader(BytesIO(pdf)))
+    data = BytesIO()
+    writer.write(data)
+    return data.getvalue()
+
+
+def write_pdf_document(
+    filename: Union[str, Path], sections: List[Tuple[str, Union[str, Path]]]
+) -> None:
+    """Write one PDF document with the pages of all (title, PDF file) sections.
+
+    Each section gets an outline entry. An existing document is only
+    replaced if it changed. Requires the optional pypdf package."""
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for title, pdf in sections:
+        writer.append(pdf, outline_item=title)
+    with open_file_replace(filename) as file:
+        writer.write(file)
+
+
+def compose_png(pngs: List[bytes], bgcolor: str) -> bytes:
+    """Return one PNG image with the input PNG diagrams stacked vertically."""
+    from PIL import Image
+
+    images = [Image.open(BytesIO(png)) for png in pngs]
+    gap = PARTITION_GAP * 96 // 72  # Graphviz renders PNG at 96 dpi by default
+    width = max(image.width for image in images)
+    height = sum(image.height for image in images) + gap * (len(images) - 1)
+    canvas = Image.new("RGB", (width, height), bgcolor)
+    y = 0
+    for image in images:
+        canvas.paste(image, (0, y))
+        y += image.height + gap
+    data = BytesIO()
+    canvas.save(data, format="PNG")
+    return data.getvalue()